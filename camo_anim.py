@@ -0,0 +1,340 @@
+"""Parameter-sweep animations: frame sequences that vary one setting.
+
+    python camo_anim.py -p "Kryptek Inspired" --sweep distortion 50 400 --frames 48 -o kryptek.png
+    python camo_anim.py -p "M81 Woodland Inspired" --sweep thresh1 2 8 --frames 30 -o frames/
+    python camo_anim.py -p "Lizard Inspired" --sweep seed 0 3 --frames 90 --fps 30 -o morph.png
+    python camo_anim.py -p "Tiger Stripe Inspired" --sweep distortion 40 160 --bench
+
+A sweep steps one of SWEEPS linearly from start to stop. "seed" morphs: the
+noise of each seed blends into the next one's (RenderParams.morph_seed and
+morph), so 0 -> 3 passes smoothly through seeds 1 and 2.
+
+Frames render through the engine caches, which already know what each step
+depends on: noise fields are keyed by their own geometry and seed, engine
+maps by the settings they read (CamoEngine.cached). Sweeping distortion in
+M81 Woodland reuses its noise and layer maps and only repaints; sweeping a
+density threshold reuses every map and only redoes the paint and composite;
+sweeping distortion in Kryptek recomputes the web but not its warp and fade
+noise. When only such settings change, the caches are enlarged for the run
+to hold a couple of frames' state (sweeping scale or a feature size changes
+every noise field, so then they are left alone), and each frame's RenderStats
+reports what was reused.
+
+Frames stream to an animated PNG (.png or .apng: 2-bit palette frames, written
+as they are rendered) or to one file per frame: a directory, or a path with a
+%d field such as frames/f%04d.png (.png or .tif, see camo_export).
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+from camo_engine import (NOISE_CACHE, PRESETS, STAGE_CACHE, SUBSCRIBERS, RenderParams, RenderStats,
+                         output_size, palette_array, publish, render_labels, set_noise_threads)
+from camo_cli import parse_size, slugify
+from camo_tiled import filter_up, open_writer, pack_2bit
+
+SWEEPS = ("scale", "distortion", "feat_a", "feat_b", "thresh1", "thresh2", "thresh3", "seed")
+
+# Settings whose sweep leaves the noise keys alone, so the next frame can
+# reuse what this one cached. Scale and the feature sizes enter noise keys.
+REUSABLE_SWEEPS = frozenset({"distortion", "thresh1", "thresh2", "thresh3", "seed_offset",
+                             "morph_seed", "morph", "colors", "layers"})
+
+# Cache bytes per output pixel allowed while the first frame renders: room for
+# the noise fields of two seeds (a morph) and one frame's maps. After it the
+# caches are cut to WORKING_SET_FRAMES times what that frame actually cached.
+NOISE_BYTES_PER_PIXEL = 160
+STAGE_BYTES_PER_PIXEL = 64
+WORKING_SET_FRAMES = 2
+
+
+def sweep(params, name, start, stop, frames):
+    """RenderParams for each of `frames` steps of `name` from start to stop
+    inclusive. Thresholds are rounded to whole steps; "seed" morphs between
+    consecutive seed offsets."""
+    if name not in SWEEPS:
+        raise ValueError(f"can only sweep one of {SWEEPS}, got {name!r}")
+    out = []
+    for value in np.linspace(start, stop, max(1, frames)):
+        if name == "seed":
+            seed = int(np.floor(value))
+            out.append(params.replace(seed_offset=seed, morph_seed=seed + 1, morph=float(value - seed)))
+        elif name.startswith("thresh"):
+            out.append(params.replace(**{name: int(round(value))}))
+        else:
+            out.append(params.replace(**{name: float(value)}))
+    return out
+
+
+@contextmanager
+def cache_budget(noise_bytes, stage_bytes):
+    """Set NOISE_CACHE and STAGE_CACHE to the given sizes for the duration
+    (evicting if they shrink), restoring the old limits afterwards."""
+    old = NOISE_CACHE.max_bytes, STAGE_CACHE.max_bytes
+    NOISE_CACHE.resize(noise_bytes)
+    STAGE_CACHE.resize(stage_bytes)
+    try:
+        yield
+    finally:
+        NOISE_CACHE.resize(old[0])
+        STAGE_CACHE.resize(old[1])
+
+
+def swept_fields(frames):
+    """Names of the RenderParams fields that differ between `frames`."""
+    first = frames[0].to_dict()
+    return {name for params in frames[1:] for name, value in params.to_dict().items()
+            if value != first[name]}
+
+
+def render_sequence(frames, resolution=1.0, cache_mb=None):
+    """Yield (labels, stats) for each RenderParams in `frames`, in order.
+
+    Every frame is a full render_labels() result; what carries over between
+    frames is whatever the caches hold. `cache_mb` sets the cache space for
+    the run, split evenly between noise and stage caches, even if that is
+    below their usual limits. By default the caches are only enlarged when the frames
+    differ in REUSABLE_SWEEPS settings alone, and then to WORKING_SET_FRAMES
+    times what the first frame cached. Stats are published to subscribers
+    like any render's.
+    """
+    if not frames:
+        return
+    w, h = output_size(frames[0], resolution)
+    limits = NOISE_CACHE.max_bytes, STAGE_CACHE.max_bytes
+    fit = False
+    if cache_mb:
+        noise_bytes = stage_bytes = cache_mb * 1024 * 1024 // 2
+    elif swept_fields(frames) <= REUSABLE_SWEEPS:
+        noise_bytes = max(limits[0], w * h * NOISE_BYTES_PER_PIXEL)
+        stage_bytes = max(limits[1], w * h * STAGE_BYTES_PER_PIXEL)
+        fit = True
+    else:
+        noise_bytes, stage_bytes = limits  # nothing carries over: keep the usual limits
+    with cache_budget(noise_bytes, stage_bytes):
+        before = NOISE_CACHE.nbytes, STAGE_CACHE.nbytes
+        for i, params in enumerate(frames):
+            stats = RenderStats(params, resolution)
+            labels = render_labels(params, resolution, stats=stats)
+            stats.finish()
+            if fit and i == 0:
+                for cache, limit, start in zip((NOISE_CACHE, STAGE_CACHE), limits, before):
+                    grown = WORKING_SET_FRAMES * (cache.nbytes - start)
+                    cache.resize(max(limit, min(cache.max_bytes, grown)))
+            if SUBSCRIBERS: publish(stats)
+            yield labels, stats
+
+
+def describe_reuse(stats):
+    """What a frame took from the caches, e.g. "noise x3, woodland_maps"."""
+    parts = [name if n == 1 else f"{name} x{n}" for name, n in sorted(stats.reused.items())]
+    return ", ".join(parts) or "nothing"
+
+
+class APNGStreamWriter:
+    """Writes an animated PNG frame by frame: role-label frames stored as 2-bit
+    palette images sharing one palette, shown for 1/fps s each, looping `loops`
+    times (0 = forever). Viewers without APNG support show the first frame.
+
+    The frame count goes in the header up front and is corrected on close if
+    fewer frames were written.
+    """
+    def __init__(self, path, width, height, frames, palette, fps=24, loops=0, compress_level=6):
+        self.f = open(path, "wb")
+        self.width, self.height = width, height
+        self.compress_level = compress_level
+        self.delay = (100, max(1, int(round(fps * 100))))  # seconds = num / den
+        self.seq = 0
+        self.frames = 0
+        self.f.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 2, 3, 0, 0, 0))
+        self._chunk(b"PLTE", np.asarray(palette, dtype=np.uint8).tobytes())
+        self.actl_at = self.f.tell()
+        self.loops = loops
+        self._chunk(b"acTL", struct.pack(">II", frames, loops))
+
+    def _chunk(self, tag, data):
+        self.f.write(struct.pack(">I", len(data)))
+        self.f.write(tag + data)
+        self.f.write(struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    def write(self, labels):
+        if labels.shape != (self.height, self.width):
+            raise ValueError(f"frame is {labels.shape[1]}x{labels.shape[0]}, "
+                             f"animation is {self.width}x{self.height}")
+        packed = pack_2bit(labels)
+        rows = filter_up(packed, np.zeros(packed.shape[1], dtype=np.uint8))
+        z = zlib.compressobj(self.compress_level, zlib.DEFLATED, 15, 9, zlib.Z_RLE)
+        data = z.compress(rows.tobytes()) + z.flush()
+        # fcTL: full-frame region, no disposal, frame replaces the canvas.
+        self._chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.seq, self.width, self.height, 0, 0,
+                                         *self.delay, 0, 0))
+        self.seq += 1
+        if self.frames == 0:
+            self._chunk(b"IDAT", data)
+        else:
+            self._chunk(b"fdAT", struct.pack(">I", self.seq) + data)
+            self.seq += 1
+        self.frames += 1
+
+    def close(self):
+        self._chunk(b"IEND", b"")
+        end = self.f.tell()
+        self.f.seek(self.actl_at)
+        self._chunk(b"acTL", struct.pack(">II", self.frames, self.loops))
+        self.f.seek(end)
+        self.f.close()
+
+
+class FrameFileWriter:
+    """Writes each frame to its own 2-bit palette .png or .tif, numbered by the
+    %d field of `pattern`."""
+    def __init__(self, pattern, width, height, palette, compress_level=6):
+        self.pattern, self.width, self.height = pattern, width, height
+        self.palette, self.compress_level = palette, compress_level
+        self.frames = 0
+        os.makedirs(os.path.dirname(pattern) or ".", exist_ok=True)
+
+    def write(self, labels):
+        writer = open_writer(self.pattern % self.frames, self.width, self.height, self.height,
+                             self.compress_level, palette=self.palette, tiff_compression="deflate")
+        try:
+            writer.write(labels)
+        finally:
+            writer.close()
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+def open_sequence_writer(path, width, height, frames, colors, fps=24, loops=0, compress_level=6):
+    """APNG writer for a .png/.apng path, else a per-frame writer for a
+    directory or %d pattern."""
+    palette = palette_array(colors)
+    if "%" not in path and path.lower().endswith((".png", ".apng")):
+        return APNGStreamWriter(path, width, height, frames, palette, fps, loops, compress_level)
+    if "%" not in path:
+        path = os.path.join(path, "frame_%04d.png")
+    return FrameFileWriter(path, width, height, palette, compress_level)
+
+
+def render_animation(frames, path, resolution=1.0, fps=24, loops=0, compress_level=6, cache_mb=None,
+                     progress=None):
+    """Render `frames` (e.g. from sweep) into `path`, streaming each frame out
+    as it is rendered. `progress(index, labels, stats)` is called per frame."""
+    w, h = output_size(frames[0], resolution)
+    writer = open_sequence_writer(path, w, h, len(frames), frames[0].colors, fps, loops, compress_level)
+    try:
+        for i, (labels, stats) in enumerate(render_sequence(frames, resolution, cache_mb)):
+            writer.write(labels)
+            if progress: progress(i, labels, stats)
+    finally:
+        writer.close()
+
+
+def benchmark(frames, resolution=1.0, cache_mb=None, repeat=1):
+    """Frames per second rendering `frames` as a sequence (caches carried over)
+    and cold (caches cleared before every frame, i.e. a full render each).
+
+    An untimed warm-up render of the first frame comes first, so kernel
+    compilation and thread start-up count against neither pass. Each pass then
+    starts from empty caches, and the best of `repeat` runs is kept. Encoding
+    is not included.
+    """
+    render_labels(frames[0], resolution)
+    incremental = cold = float("inf")
+    for _ in range(max(1, repeat)):
+        NOISE_CACHE.clear()
+        STAGE_CACHE.clear()
+        reused = {}
+        t0 = time.perf_counter()
+        for _, stats in render_sequence(frames, resolution, cache_mb):
+            for name, n in stats.reused.items():
+                reused[name] = reused.get(name, 0) + n
+        incremental = min(incremental, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for params in frames:
+            NOISE_CACHE.clear()
+            STAGE_CACHE.clear()
+            render_labels(params, resolution)
+        cold = min(cold, time.perf_counter() - t0)
+    w, h = output_size(frames[0], resolution)
+    return {"mode": frames[0].mode, "frames": len(frames), "width": w, "height": h,
+            "sequence_fps": round(len(frames) / incremental, 2), "cold_fps": round(len(frames) / cold, 2),
+            "speedup": round(cold / incremental, 2), "reused": reused}
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(description="Render a parameter sweep or seed morph as an animation.")
+    ap.add_argument("-p", "--preset", required=True, choices=list(PRESETS), metavar="PRESET")
+    ap.add_argument("--sweep", nargs=3, required=True, metavar=("PARAM", "START", "STOP"),
+                    help=f"setting to sweep, one of {', '.join(SWEEPS)}")
+    ap.add_argument("--frames", type=int, default=48)
+    ap.add_argument("--fps", type=float, default=24.0)
+    ap.add_argument("--loops", type=int, default=0, help="APNG repeat count (default 0 = forever)")
+    ap.add_argument("-o", "--output", help=".png/.apng animation, or a directory or %%d pattern for frames")
+    ap.add_argument("--seed", type=int, default=0, help="seed offset (start seed when morphing)")
+    ap.add_argument("--size", type=parse_size, help="WIDTHxHEIGHT, default 900x700")
+    ap.add_argument("--resolution", type=float, default=1.0, help="render at this fraction of --size")
+    ap.add_argument("--digital", action="store_true", help="digital / pixelated mode")
+    ap.add_argument("--tileable", action="store_true", help="every frame a seamless repeat tile")
+    ap.add_argument("--compress", type=int, default=6, choices=range(10), metavar="LEVEL",
+                    help="zlib level 0-9 (default 6)")
+    ap.add_argument("--cache-mb", type=int, metavar="MB",
+                    help="cache space for the run, split between noise and stage caches, even below "
+                         "their usual limits (default: sized to the first frame)")
+    ap.add_argument("--threads", type=int, metavar="N",
+                    help="threads generating a render's noise fields (default: CPU count)")
+    ap.add_argument("--bench", action="store_true",
+                    help="print frames per second, sequence vs. cold re-render, as JSON instead of writing")
+    ap.add_argument("--repeat", type=int, default=1, metavar="N",
+                    help="with --bench, time each pass N times and keep the best")
+    ap.add_argument("--stats", action="store_true", help="print per-stage timings and reuse of each frame")
+    ap.add_argument("-q", "--quiet", action="store_true")
+    return ap
+
+
+def main(argv=None):
+    ap = build_parser()
+    args = ap.parse_args(argv)
+    name, start, stop = args.sweep
+    try:
+        start, stop = float(start), float(stop)
+    except ValueError:
+        ap.error("--sweep START and STOP must be numbers")
+    overrides = {"seed_offset": args.seed, "digital": args.digital, "tileable": args.tileable}
+    if args.size: overrides["width"], overrides["height"] = args.size
+    try:
+        frames = sweep(RenderParams.from_preset(args.preset, **overrides), name, start, stop, args.frames)
+    except ValueError as e:
+        ap.error(str(e))
+    if args.threads:
+        set_noise_threads(args.threads)
+    if args.bench:
+        print(json.dumps(benchmark(frames, args.resolution, args.cache_mb, args.repeat), indent=1))
+        return 0
+    out = args.output or f"{slugify(args.preset)}_{name}.png"
+
+    def progress(i, labels, stats):
+        if args.stats:
+            print(f"  frame {i}: {stats.summary()} | reused {describe_reuse(stats)}")
+        elif not args.quiet and i == 1:
+            print(f"  reused across frames: {describe_reuse(stats)}")
+    t0 = time.perf_counter()
+    render_animation(frames, out, args.resolution, args.fps, args.loops, args.compress, args.cache_mb, progress)
+    if not args.quiet:
+        seconds = time.perf_counter() - t0
+        print(f"{out}  ({len(frames)} frames, {seconds:.2f}s, {len(frames) / seconds:.1f} fps)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
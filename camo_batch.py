@@ -0,0 +1,198 @@
+"""Process-pool batch renderer for catalogue runs.
+
+A batch spec describes a job matrix of presets x seeds x palettes:
+
+    {
+      "presets": ["Kryptek Inspired", "Tiger Stripe Inspired"],
+      "seeds": {"start": 0, "count": 10},
+      "palettes": {"default": null,
+                   "desert": {"base": "#D8C8A0", "layer1": "#A08060"}},
+      "size": [7200, 5400],
+      "overrides": {"digital": false},
+      "max_memory": 512,
+      "metadata": true,
+      "format": "tif",
+      "dpi": 300
+    }
+
+    python camo_batch.py spec.json -o catalogue/ -j 8
+
+"presets" may be "all", "seeds" may be an explicit list, a null palette
+keeps the preset's own colours, and "max_memory" switches to banded
+rendering (camo_tiled) for print sizes. "metadata" embeds each job's params
+(and repeat size, for tileable jobs) in the PNG/TIFF. "format" is png (the
+default), tif or svg, written by camo_export as 2-bit palette images or traced
+vectors with "dpi" recorded in them, or jpg.
+
+Each finished image is written to disk straight away and logged to
+manifest.jsonl, so an interrupted batch picks up where it stopped when run
+again; a job whose parameters or format changed since it was logged is
+rendered again. manifest.json with every job's parameters, file and timing is written
+at the end. Every job renders from its own parameters only, so output is
+byte-identical whatever the worker count or completion order.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from camo_engine import PRESETS, RenderParams, render_image, save_image, set_noise_threads
+from camo_cli import slugify
+from camo_export import EXPORT_FORMATS, export
+from camo_tiled import render_to_file
+
+MANIFEST_LOG = "manifest.jsonl"
+MANIFEST = "manifest.json"
+
+
+def expand_jobs(spec):
+    """Turn a batch spec into an ordered list of job dicts with stable ids."""
+    presets = spec.get("presets", "all")
+    if presets == "all":
+        presets = list(PRESETS)
+    seeds = spec.get("seeds", [0])
+    if isinstance(seeds, dict):
+        seeds = list(range(seeds.get("start", 0), seeds.get("start", 0) + seeds["count"]))
+    palettes = spec.get("palettes") or {"default": None}
+    fmt = spec.get("format", "png")
+    slugs = {}
+    for pal_name in palettes:
+        other = slugs.setdefault(slugify(pal_name), pal_name)
+        if other != pal_name:
+            raise ValueError(f"palette names {other!r} and {pal_name!r} both map to file name "
+                             f"{slugify(pal_name)!r}")
+    jobs = []
+    for mode in presets:
+        for seed in seeds:
+            for pal_name, colors in palettes.items():
+                job = dict(spec.get("overrides", {}))
+                job.update({"preset": mode, "seed_offset": seed})
+                if "size" in spec:
+                    job["width"], job["height"] = spec["size"]
+                if colors:
+                    job["colors"] = colors
+                job_id = f"{slugify(mode)}_s{seed}_{slugify(pal_name)}"
+                jobs.append({"id": job_id, "file": f"{job_id}.{fmt}", "params": job})
+    return jobs
+
+
+def render_job(job, out_dir, max_memory=None, metadata=False, dpi=None):
+    """Worker: render one job to its file. Returns its manifest entry."""
+    params = RenderParams.from_dict(dict(job["params"]))
+    fp = os.path.join(out_dir, job["file"])
+    tmp = f"{fp}.part{os.path.splitext(fp)[1]}"
+    t0 = time.perf_counter()
+    if os.path.splitext(fp)[1][1:].lower() in EXPORT_FORMATS:
+        export(params, tmp, dpi=dpi, max_memory_mb=max_memory, metadata=metadata)
+    elif max_memory:
+        render_to_file(params, tmp, max_memory_mb=max_memory, metadata=metadata)
+    else:
+        save_image(render_image(params), tmp, params if metadata else None)
+    seconds = time.perf_counter() - t0
+    os.replace(tmp, fp)  # never leave a half-written file behind for resume to trust
+    with open(fp, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {"id": job["id"], "file": job["file"], "params": params.to_dict(),
+            "seconds": round(seconds, 4), "sha256": digest, "pid": os.getpid()}
+
+
+def load_done(out_dir):
+    """Manifest entries from a previous run whose files are still on disk."""
+    done = {}
+    path = os.path.join(out_dir, MANIFEST_LOG)
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if os.path.exists(os.path.join(out_dir, entry["file"])):
+                done[entry["id"]] = entry
+    return done
+
+
+def is_current(entry, job):
+    """True when a manifest entry is a finished render of `job` as it stands
+    now: same file and same parameters (size, overrides, colours...)."""
+    if entry is None or entry["file"] != job["file"]:
+        return False
+    return entry["params"] == RenderParams.from_dict(dict(job["params"])).to_dict()
+
+
+def run_batch(spec, out_dir, workers=None, resume=True, progress=None):
+    """Render every job in `spec` into `out_dir` and return the manifest dict."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = expand_jobs(spec)
+    done = load_done(out_dir) if resume else {}
+    todo = [j for j in jobs if not is_current(done.get(j["id"]), j)]
+    max_memory = spec.get("max_memory")
+    metadata = spec.get("metadata", False)
+    dpi = spec.get("dpi")
+    failures = {}
+    t0 = time.perf_counter()
+    log_path = os.path.join(out_dir, MANIFEST_LOG)
+    if resume and os.path.exists(log_path) and os.path.getsize(log_path):
+        with open(log_path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n": f.write(b"\n")
+    # Split the cores between worker processes and their noise threads.
+    threads = max(1, (os.cpu_count() or 1) // (workers or os.cpu_count() or 1))
+    with open(log_path, "a" if resume else "w") as log, \
+            ProcessPoolExecutor(max_workers=workers, initializer=set_noise_threads,
+                                initargs=(threads,)) as pool:
+        futures = {pool.submit(render_job, job, out_dir, max_memory, metadata, dpi): job for job in todo}
+        for fut in as_completed(futures):
+            job = futures[fut]
+            try:
+                entry = fut.result()
+            except Exception as e:
+                failures[job["id"]] = repr(e)
+                continue
+            done[entry["id"]] = entry
+            log.write(json.dumps(entry) + "\n")
+            log.flush()
+            if progress: progress(len(done), len(jobs), entry)
+    manifest = {
+        "spec": spec,
+        "workers": workers or os.cpu_count(),
+        "wall_seconds": round(time.perf_counter() - t0, 3),
+        "rendered": len(todo) - len(failures),
+        "skipped": len(jobs) - len(todo),
+        "failures": failures,
+        "jobs": [done[j["id"]] for j in jobs if j["id"] in done],
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Render a preset x seed x palette matrix on a process pool.")
+    ap.add_argument("spec", help="batch spec JSON file")
+    ap.add_argument("-o", "--output", required=True, help="output directory")
+    ap.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    ap.add_argument("--no-resume", action="store_true", help="re-render jobs already in the manifest")
+    ap.add_argument("-q", "--quiet", action="store_true")
+    args = ap.parse_args(argv)
+    with open(args.spec) as f:
+        spec = json.load(f)
+
+    def progress(n, total, entry):
+        if not args.quiet:
+            print(f"[{n}/{total}] {entry['file']}  ({entry['seconds']:.2f}s)")
+    try:
+        manifest = run_batch(spec, args.output, args.workers, not args.no_resume, progress)
+    except ValueError as e:
+        ap.error(str(e))
+    for job_id, err in manifest["failures"].items():
+        print(f"error: {job_id}: {err}", file=sys.stderr)
+    return 1 if manifest["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
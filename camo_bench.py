@@ -0,0 +1,245 @@
+"""Benchmark harness for the pattern engines.
+
+Renders every preset at each requested size and records, per case, the wall
+time and its split between noise generation (get_noise), the rest of the
+engine (wave math and masks), compositing (label lookup and palette), image
+encoding and the digital-mode resize, plus the number of noise calls (a
+batched stack of fields counts once) and the peak traced memory:
+
+    python camo_bench.py -o bench.json
+    python camo_bench.py --sizes preview,4k -p "Kryptek Inspired" --repeat 5
+    python camo_bench.py -o new.json --baseline bench.json --threshold 0.15
+
+Caches are bypassed so every repeat renders cold. Sizes whose working set
+would exceed --max-memory render in bands, as camo_tiled does, and encode to
+a streaming PNG. The digital-mode block expansion is timed on an 8 px block
+grid taken from the label map but kept out of the wall time, since the
+presets render non-digital.
+
+With Numba installed, Kryptek and Tiger run their compiled kernels
+(camo_kernels); --no-kernels benchmarks the NumPy path instead.
+
+--precision picks the noise precision ("uint8" or "float32"), so the two can
+be benchmarked side by side; each result records the precision it ran at.
+
+With --baseline, every metric that grew by more than --threshold (and by more
+than --min-delta seconds for timings) is reported as a regression and the exit
+status is 1.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+import PIL
+
+import camo_engine
+from camo_engine import (PRECISIONS, PRESETS, RenderParams, RenderStats, CamoEngine, clear_render_contexts,
+                         expand_blocks, label_lut, palette_array, set_kernels, set_noise_threads,
+                         set_palette)
+from camo_tiled import BYTES_PER_PIXEL, PNGStreamWriter, band_height
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SIZES = {"preview": (900, 700), "4k": (3840, 2160), "16k": (15360, 8640)}
+STAGES = ["noise", "engine", "composite", "digital_resize", "encode"]
+METRICS = ["wall"] + STAGES + ["noise_calls", "peak_mb"]
+
+
+def max_rss_mb():
+    """Process peak resident set size so far, or None where unavailable."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def render_case(params, max_memory_mb):
+    """Render params once and return its stage timings and noise call count."""
+    w, h = params.width, params.height
+    times = dict.fromkeys(STAGES, 0.0)
+    stats = RenderStats(params)
+    engine = CamoEngine(params, use_cache=False, stats=stats)
+    banded = w * h * BYTES_PER_PIXEL > max_memory_mb * 1024 * 1024
+    band_rows = band_height(w, max_memory_mb) if banded else h
+    writer = PNGStreamWriter(os.devnull, w, h) if banded else None
+    palette = palette_array(params.colors)
+    try:
+        for y0 in range(0, h, band_rows):
+            rows = np.arange(y0, min(h, y0 + band_rows))
+            t0 = time.perf_counter()
+            codes, steps = engine.generate_codes(rows)
+            t1 = time.perf_counter()
+            labels = label_lut(steps, params.layers)[codes]
+            if banded:
+                band = palette[labels]
+            else:
+                img = Image.fromarray(labels)
+                set_palette(img, params.colors)
+            t2 = time.perf_counter()
+            expand_blocks(labels[::8, ::8], labels.shape[1], labels.shape[0])
+            t3 = time.perf_counter()
+            if banded:
+                writer.write(band)
+            else:
+                img.save(io.BytesIO(), "PNG")
+            t4 = time.perf_counter()
+            times["engine"] += t1 - t0
+            times["composite"] += t2 - t1
+            times["digital_resize"] += t3 - t2
+            times["encode"] += t4 - t3
+    finally:
+        if writer: writer.close()
+    times["noise"] = stats.times.get("noise", 0.0)
+    times["engine"] -= times["noise"]
+    times["wall"] = sum(times[s] for s in STAGES if s != "digital_resize")
+    return times, stats.noise_calls, banded
+
+
+def bench_case(mode, size_name, repeat=3, max_memory_mb=2048, precision="uint8"):
+    """Benchmark one preset at one size: a traced run for peak memory, then
+    `repeat` timed runs of which the fastest is kept.
+
+    The traced run follows an untraced warm-up from cleared render contexts,
+    so its peak does not depend on which cases ran before it.
+    """
+    w, h = SIZES[size_name]
+    params = RenderParams.from_preset(mode, width=w, height=h, precision=precision)
+    clear_render_contexts()
+    render_case(params, max_memory_mb)
+    tracemalloc.start()
+    try:
+        render_case(params, max_memory_mb)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    best = None
+    for _ in range(repeat):
+        times, calls, banded = render_case(params, max_memory_mb)
+        if best is None or times["wall"] < best["wall"]:
+            best = times
+    result = {"preset": mode, "size": [w, h], "precision": precision, "banded": banded,
+              "noise_calls": calls,
+              "peak_mb": round(peak / (1024 * 1024), 1), "rss_high_water_mb": max_rss_mb()}
+    result.update({k: round(v, 4) for k, v in best.items()})
+    return result
+
+
+def environment():
+    return {"date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "pillow": PIL.__version__, "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "noise_threads": camo_engine.NOISE_THREADS,
+            "kernels": camo_engine.USE_KERNELS}
+
+
+def run_bench(presets, sizes, repeat=3, max_memory_mb=2048, progress=None, precision="uint8"):
+    """Benchmark every preset x size; returns {"env": ..., "results": {case: ...}}."""
+    results = {}
+    for size_name in sizes:
+        for mode in presets:
+            case = f"{mode}@{size_name}"
+            results[case] = bench_case(mode, size_name, repeat, max_memory_mb, precision)
+            if progress: progress(case, results[case])
+    return {"env": environment(), "repeat": repeat, "max_memory_mb": max_memory_mb,
+            "precision": precision, "results": results}
+
+
+def compare(current, baseline, threshold=0.15, min_delta=0.005):
+    """Metrics that regressed against `baseline`, as (case, metric, old, new) tuples.
+
+    A metric regresses when it grew by more than `threshold` (relative); timings
+    must also have grown by more than `min_delta` seconds, so sub-millisecond
+    jitter on fast stages is not reported. Cases missing from either side are skipped.
+    """
+    regressions = []
+    for case, new in current["results"].items():
+        old = baseline["results"].get(case)
+        if old is None:
+            continue
+        for metric in METRICS:
+            a, b = old.get(metric), new.get(metric)
+            if a is None or b is None or b <= a * (1 + threshold):
+                continue
+            if metric in STAGES + ["wall"] and b - a <= min_delta:
+                continue
+            regressions.append((case, metric, a, b))
+    return regressions
+
+
+def format_row(case, r):
+    return (f"{case:42s} {r['wall']:8.3f} {r['noise']:8.3f} {r['noise_calls']:5d} "
+            f"{r['engine']:8.3f} {r['composite']:8.3f} {r['digital_resize']:8.3f} "
+            f"{r['encode']:8.3f} {r['peak_mb']:9.1f}{'  banded' if r['banded'] else ''}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark every pattern engine at several sizes.")
+    ap.add_argument("-p", "--preset", action="append", default=[],
+                    help="preset to benchmark (repeatable, default: all)")
+    ap.add_argument("--sizes", default="preview,4k,16k",
+                    help=f"comma-separated sizes from {', '.join(SIZES)}")
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per case; the fastest is kept")
+    ap.add_argument("--max-memory", type=int, default=2048, metavar="MB",
+                    help="render in bands above this working set (default 2048)")
+    ap.add_argument("--threads", type=int, metavar="N",
+                    help="noise threads per render (default: CPU count)")
+    ap.add_argument("--no-kernels", action="store_true",
+                    help="use the NumPy path even when Numba kernels are available")
+    ap.add_argument("--precision", choices=PRECISIONS, default="uint8",
+                    help="noise precision to benchmark (default uint8)")
+    ap.add_argument("-o", "--output", help="write results JSON here")
+    ap.add_argument("--baseline", help="results JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.15,
+                    help="relative growth reported as a regression (default 0.15)")
+    ap.add_argument("--min-delta", type=float, default=0.005,
+                    help="ignore timing growth below this many seconds (default 0.005)")
+    ap.add_argument("-q", "--quiet", action="store_true")
+    args = ap.parse_args(argv)
+    if args.threads:
+        set_noise_threads(args.threads)
+    if args.no_kernels:
+        set_kernels(False)
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    for s in sizes:
+        if s not in SIZES:
+            ap.error(f"unknown size {s!r}; choose from {', '.join(SIZES)}")
+    for mode in args.preset:
+        if mode not in PRESETS:
+            ap.error(f"unknown preset {mode!r}")
+
+    if not args.quiet:
+        print(f"{'case':42s} {'wall':>8s} {'noise':>8s} {'calls':>5s} {'engine':>8s} "
+              f"{'comp':>8s} {'digital':>8s} {'encode':>8s} {'peak MB':>9s}")
+
+    def progress(case, result):
+        if not args.quiet: print(format_row(case, result))
+    current = run_bench(args.preset or list(PRESETS), sizes, args.repeat, args.max_memory, progress,
+                        args.precision)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold, args.min_delta)
+    for case, metric, old, new in regressions:
+        print(f"regression: {case} {metric}: {old} -> {new} (+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+    if not regressions and not args.quiet:
+        print(f"no regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
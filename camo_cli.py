@@ -0,0 +1,180 @@
+"""Command-line renderer for Universal Camo Gen.
+
+Renders presets straight to disk without importing tkinter:
+
+    python camo_cli.py --list
+    python camo_cli.py -p "Kryptek Inspired" --seed 3 --size 3840x2160 -o kryptek.png
+    python camo_cli.py -p "Tiger Stripe Inspired" -p "Lizard Inspired" -o renders/
+    python camo_cli.py --jobs jobs.json -o renders/
+    python camo_cli.py -p "M81 Woodland Inspired" --size 30000x30000 --max-memory 512 -o roll.tif
+    python camo_cli.py -p "Lizard Inspired" --size 2048x2048 --tileable --metadata -o repeat.png
+    python camo_cli.py -p "Kryptek Inspired" --print-width 24 --dpi 300 -o kryptek.tif
+    python camo_cli.py -p "Flecktarn Inspired" --digital --out-width 2000 -o flecktarn.svg
+
+.png, .tif and .svg output goes through camo_export: 2-bit palette rasters or
+traced vector paths, at the size set by --out-width or --print-width/--dpi.
+
+A job file is either a JSON list of objects or a CSV with a header row. Each
+entry takes the keys understood by RenderParams.from_dict, plus an optional
+"output" filename (relative to the output directory).
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+from camo_engine import (NO_STAGE, PRECISIONS, PRESETS, STATS_LOG, RenderParams, log_stats, new_stats,
+                         publish, render_image, save_image, set_noise_threads, subscribe)
+from camo_export import EXPORT_FORMATS, TIFF_COMPRESSION, export, export_resolution
+from camo_tiled import render_to_file
+
+
+def slugify(name):
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def default_filename(params):
+    name = f"{slugify(params.mode)}_s{params.seed_offset}_{params.width}x{params.height}"
+    if params.digital: name += "_digital"
+    if params.tileable: name += "_tile"
+    return name + ".png"
+
+
+def parse_size(text):
+    try:
+        w, h = text.lower().split("x")
+        return int(w), int(h)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"size must look like 1920x1080, got {text!r}")
+
+
+def load_jobs(path):
+    """Read a JSON or CSV job file into a list of dicts."""
+    with open(path, newline="") as f:
+        if path.lower().endswith(".csv"):
+            return list(csv.DictReader(f))
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("jobs", [])
+    return data
+
+
+def jobs_from_args(args):
+    jobs = []
+    for mode in args.preset:
+        job = {"preset": mode, "seed_offset": args.seed, "digital": args.digital,
+               "tileable": args.tileable, "block_size": args.block_size,
+               "macro_block_size": args.macro_block, "precision": args.precision}
+        if args.size: job["width"], job["height"] = args.size
+        jobs.append(job)
+    return jobs
+
+
+def output_path(args, job, params, count):
+    out = args.output
+    if count == 1 and out.lower().endswith((".png", ".tif", ".tiff", ".svg", ".jpg", ".npy")):
+        return out
+    return os.path.join(out, job.get("output") or default_filename(params))
+
+
+def run(jobs, args):
+    failures = 0
+    for job in jobs:
+        try:
+            params = RenderParams.from_dict(dict(job))
+            fp = output_path(args, job, params, len(jobs))
+            os.makedirs(os.path.dirname(fp) or ".", exist_ok=True)
+            t0 = time.perf_counter()
+            if fp.lower().rsplit(".", 1)[-1] in EXPORT_FORMATS:
+                dpi = args.dpi or (300 if args.print_width else None)
+                res = export_resolution(params, width=args.out_width, print_width=args.print_width,
+                                        dpi=dpi or 300)
+                export(params, fp, resolution=res, dpi=dpi, compress_level=args.compress,
+                       tiff_compression=args.tiff_compression, max_memory_mb=args.max_memory,
+                       metadata=args.metadata)
+            elif args.max_memory or fp.lower().endswith(".npy"):
+                # save_image has no .npy writer, so .npy always goes through the band writer.
+                render_to_file(params, fp, max_memory_mb=args.max_memory or 256, metadata=args.metadata)
+            else:
+                stats = new_stats(params)
+                img = render_image(params, stats=stats)
+                with stats.stage("encode") if stats else NO_STAGE:
+                    save_image(img, fp, params if args.metadata else None)
+                if stats: publish(stats.finish())
+            if not args.quiet:
+                print(f"{fp}  ({time.perf_counter() - t0:.2f}s)")
+        except Exception as e:
+            failures += 1
+            print(f"error: {job!r}: {e}", file=sys.stderr)
+    return failures
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(description="Render camo patterns without the GUI.")
+    ap.add_argument("-p", "--preset", action="append", default=[],
+                    help="preset name to render (repeatable)")
+    ap.add_argument("--jobs", help="JSON or CSV job file")
+    ap.add_argument("-o", "--output", default=".",
+                    help="output file (single render) or directory")
+    ap.add_argument("--seed", type=int, default=0, help="seed offset")
+    ap.add_argument("--size", type=parse_size, help="WIDTHxHEIGHT, default 900x700")
+    ap.add_argument("--digital", action="store_true", help="digital / pixelated mode")
+    ap.add_argument("--block-size", type=int, default=8, metavar="PX",
+                    help="digital block size in pixels (default 8)")
+    ap.add_argument("--macro-block", type=int, default=0, metavar="PX",
+                    help="digital multi-scale: draw layer 1 with this coarser block size")
+    ap.add_argument("--tileable", action="store_true",
+                    help="render a seamless repeat tile (output wraps at its edges)")
+    ap.add_argument("--precision", choices=PRECISIONS, default="uint8",
+                    help="noise precision: 8-bit lattice upscale (default) or float32 end to end")
+    ap.add_argument("--metadata", action="store_true",
+                    help="embed the params and repeat size in PNG/TIFF output")
+    ap.add_argument("--max-memory", type=int, metavar="MB",
+                    help="render in bands within MB of working memory (.png/.tif/.npy output)")
+    ap.add_argument("--out-width", type=int, metavar="PX",
+                    help="export width in pixels; the height keeps the aspect ratio (.png/.tif/.svg)")
+    ap.add_argument("--print-width", type=float, metavar="IN",
+                    help="export width in inches at --dpi (default 300)")
+    ap.add_argument("--dpi", type=float, help="resolution recorded in .png/.tif/.svg output")
+    ap.add_argument("--compress", type=int, default=6, choices=range(10), metavar="LEVEL",
+                    help="zlib level 0-9 for .png and Deflate .tif output (default 6)")
+    ap.add_argument("--tiff-compression", choices=TIFF_COMPRESSION, default="deflate",
+                    help="TIFF strip compression (default deflate)")
+    ap.add_argument("--threads", type=int, metavar="N",
+                    help="threads generating a render's noise fields (default: CPU count)")
+    ap.add_argument("--stats", action="store_true", help="print per-stage timings of each render")
+    ap.add_argument("--stats-log", metavar="FILE",
+                    help="append per-stage timings of each render to FILE as JSON lines")
+    ap.add_argument("--list", action="store_true", help="list preset names and exit")
+    ap.add_argument("-q", "--quiet", action="store_true")
+    return ap
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.list:
+        for name in PRESETS: print(name)
+        return 0
+    jobs = load_jobs(args.jobs) if args.jobs else []
+    jobs += jobs_from_args(args)
+    if not jobs:
+        build_parser().error("nothing to render: pass --preset or --jobs")
+    if args.threads:
+        set_noise_threads(args.threads)
+    if args.stats:
+        subscribe(lambda stats: print(f"  {stats.summary()}"))
+    if args.stats_log:
+        handler = logging.FileHandler(args.stats_log)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        STATS_LOG.addHandler(handler)
+        STATS_LOG.setLevel(logging.INFO)
+        subscribe(log_stats)
+    return 1 if run(jobs, args) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
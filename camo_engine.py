@@ -0,0 +1,1267 @@
+"""Headless render engine for Universal Camo Gen.
+
+Pure NumPy/Pillow implementation of every pattern engine. Nothing in here
+touches tkinter, so it can be imported on build nodes without a display.
+
+    from camo_engine import RenderParams, render_image
+    img = render_image(RenderParams.from_preset("Kryptek Inspired", seed_offset=3))
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, asdict
+import json
+import logging
+import os
+import threading
+import time
+
+from PIL import Image, PngImagePlugin
+import numpy as np
+
+import camo_kernels
+
+ROLES = ["base", "layer1", "layer2", "layer3"]
+LAYER_ROLES = ["layer1", "layer2", "layer3"]
+
+# --- PRESETS ---
+PRESETS = {
+    "Tiger Stripe Inspired": {
+        "colors": {"base": "#C3B091", "layer1": "#384A20", "layer2": "#6F4E37", "layer3": "#101010"},
+        "params": {"scale": 7.0, "distortion": 80.0, "feat_a": 15.0, "feat_b": 2.0,
+                   "thresh1": 3, "thresh2": 5, "thresh3": 3}
+    },
+    "M81 Woodland Inspired": {
+        "colors": {"base": "#B0A182", "layer1": "#3F4533", "layer2": "#4A3224", "layer3": "#121212"},
+        "params": {"scale": 10.0, "distortion": 120.0, "feat_a": 7.0, "feat_b": 1.0,
+                   "thresh1": 6, "thresh2": 4, "thresh3": 2}
+    },
+    "Flecktarn Inspired": {
+        "colors": {"base": "#586243", "layer1": "#6D5F44", "layer2": "#3B422E", "layer3": "#181A16"},
+        "params": {"scale": 15.0, "distortion": 66.0, "feat_a": 13.0, "feat_b": 25.0,
+                   "thresh1": 5, "thresh2": 3, "thresh3": 1}
+    },
+    "Chocolate Chip Inspired": {
+        "colors": {"base": "#FFFFFF", "layer1": "#8B4513", "layer2": "#000000", "layer3": "#D2B48C"},
+        "params": {"scale": 60.0, "distortion": 0.0, "feat_a": 1.0, "feat_b": 0.0,
+                   "thresh1": 6, "thresh2": 5, "thresh3": 1}
+    },
+    "British DPM Inspired": {
+        "colors": {"base": "#C8B682", "layer1": "#575E40", "layer2": "#6F482F", "layer3": "#151515"},
+        "params": {"scale": 25.0, "distortion": 22.0, "feat_a": 0.0, "feat_b": 1.1,
+                   "thresh1": 4, "thresh2": 4, "thresh3": 1}
+    },
+    "British Brush Stroke Inspired": {
+        "colors": {"base": "#E0D6AA", "layer1": "#788055", "layer2": "#8B4513", "layer3": "#402518"},
+        "params": {"scale": 25.0, "distortion": 40.0, "feat_a": 10.0, "feat_b": 25.0,
+                   "thresh1": 6, "thresh2": 5, "thresh3": 4}
+    },
+    "Lizard Inspired": {
+        "colors": {"base": "#E2D3A7", "layer1": "#4B5F3E", "layer2": "#8C583A", "layer3": "#3E4435"},
+        "params": {"scale": 20.0, "distortion": 30.0, "feat_a": 12.0, "feat_b": 35.0,
+                   "thresh1": 6, "thresh2": 5, "thresh3": 2}
+    },
+    "Puzzle Inspired": {
+        "colors": {"base": "#D8CBA0", "layer1": "#607045", "layer2": "#805040", "layer3": "#202020"},
+        "params": {"scale": 35.0, "distortion": 10.0, "feat_a": 1.0, "feat_b": 0.0,
+                   "thresh1": 7, "thresh2": 6, "thresh3": 5}
+    },
+    "Kryptek Inspired": {
+        "colors": {"base": "#2b2b2b", "layer1": "#4B5320", "layer2": "#707850", "layer3": "#050505"},
+        # Defaults: Scale 100, Distortion 200, Feat A 0, Feat B 50
+        "params": {"scale": 100.0, "distortion": 200.0, "feat_a": 6.0, "feat_b": 0.0,
+                   "thresh1": 5, "thresh2": 5, "thresh3": 5}
+    }
+}
+
+
+def hex2rgb(x):
+    return tuple(int(x[i:i+2], 16) for i in (1, 3, 5))
+
+
+def parse_bool(val):
+    if isinstance(val, str):
+        return val.strip().lower() in ("1", "true", "yes", "on")
+    return bool(val)
+
+
+@dataclass
+class RenderParams:
+    """Everything a render depends on. Plain values only, no Tk variables."""
+    mode: str = "Kryptek Inspired"
+    width: int = 900
+    height: int = 700
+    scale: float = 100.0
+    distortion: float = 200.0
+    feat_a: float = 6.0
+    feat_b: float = 0.0
+    thresh1: int = 5
+    thresh2: int = 5
+    thresh3: int = 5
+    colors: dict = field(default_factory=lambda: PRESETS["Kryptek Inspired"]["colors"].copy())
+    layers: dict = field(default_factory=lambda: {r: True for r in LAYER_ROLES})
+    digital: bool = False
+    block_size: int = 8
+    macro_block_size: int = 0
+    tileable: bool = False
+    precision: str = "uint8"
+    seed_offset: int = 0
+    # Seed morph: every noise field is blended from seed_offset's towards
+    # morph_seed's by `morph` (0 = seed_offset alone, 1 = morph_seed alone).
+    morph_seed: int = 0
+    morph: float = 0.0
+
+    @classmethod
+    def from_preset(cls, mode, **overrides):
+        if mode not in PRESETS:
+            raise ValueError(f"Unknown preset: {mode!r}")
+        preset = PRESETS[mode]
+        p = cls(mode=mode, colors=preset["colors"].copy(), **preset["params"])
+        return p.replace(**overrides)
+
+    @classmethod
+    def from_dict(cls, d):
+        """Build params from a job entry (JSON object or CSV row).
+
+        Starts from the preset named by "preset" (or "mode"); colour roles may be
+        given as a "colors" dict or as flat "base"/"layer1"/... keys, and layer
+        toggles as a "layers" dict or flat "show_layer1"/... keys.
+        """
+        d = {k: v for k, v in d.items() if v is not None and v != ""}
+        mode = d.pop("preset", d.pop("mode", "Kryptek Inspired"))
+        overrides = {}
+        colors = dict(d.pop("colors", {}))
+        layers = dict(d.pop("layers", {}))
+        for role in ROLES:
+            if role in d: colors[role] = d.pop(role)
+        for role in LAYER_ROLES:
+            if f"show_{role}" in d: layers[role] = d.pop(f"show_{role}")
+        for name, typ in (("width", int), ("height", int), ("scale", float),
+                          ("distortion", float), ("feat_a", float), ("feat_b", float),
+                          ("thresh1", int), ("thresh2", int), ("thresh3", int),
+                          ("block_size", int), ("macro_block_size", int), ("seed_offset", int),
+                          ("morph_seed", int), ("morph", float)):
+            if name in d: overrides[name] = typ(float(d.pop(name)))
+        for name in ("digital", "tileable"):
+            if name in d: overrides[name] = parse_bool(d.pop(name))
+        if "precision" in d: overrides["precision"] = str(d.pop("precision")).lower()
+        p = cls.from_preset(mode, **overrides)
+        p.colors.update(colors)
+        p.layers.update({k: parse_bool(v) for k, v in layers.items()})
+        return p
+
+    def replace(self, **changes):
+        d = asdict(self)
+        d.update(changes)
+        return RenderParams(**d)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class RenderCancelled(Exception):
+    """Raised inside a render whose should_cancel callback returned True."""
+
+
+class LRUCache:
+    """Thread-safe LRU of NumPy arrays (or tuples of them), bounded by total bytes.
+
+    Cached arrays are made read-only, so callers must not modify them in place.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.data = OrderedDict()
+        self.sizes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, make):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+        value = make()
+        arrays = value if isinstance(value, tuple) else (value,)
+        size = 0
+        for a in arrays:
+            a.flags.writeable = False
+            size += a.nbytes
+        if size > self.max_bytes:
+            return value
+        with self.lock:
+            if key not in self.data:
+                self.data[key] = value
+                self.sizes[key] = size
+                self.nbytes += size
+            self._evict()
+        return value
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes:
+            old, _ = self.data.popitem(last=False)
+            self.nbytes -= self.sizes.pop(old)
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        """Change the byte bound, evicting least recently used entries to fit."""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.sizes.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.data), "bytes": self.nbytes, "max_bytes": self.max_bytes}
+
+
+# Shared by every engine in the process. Noise fields are keyed by everything
+# get_noise depends on; stage maps by engine stage plus the params it reads.
+NOISE_CACHE = LRUCache(256 * 1024 * 1024)
+STAGE_CACHE = LRUCache(128 * 1024 * 1024)
+
+
+def cache_stats():
+    return {"noise": NOISE_CACHE.stats(), "stages": STAGE_CACHE.stats()}
+
+
+# --- INSTRUMENTATION ---
+class RenderStats:
+    """Per-stage timings of one render.
+
+    Stage times are exclusive: a stage that runs inside another (noise inside
+    "flow", say) is only counted once, so the stage times add up to the time
+    spent in stages. `noise_calls` counts noise requests, a batched stack of
+    fields counting once; `noise_bytes` counts freshly generated noise fields
+    only, since cache hits allocate nothing. `reused` counts, per stage name
+    (and "noise"), the results taken from the caches instead of computed.
+    """
+    def __init__(self, params=None, resolution=1.0):
+        self.params = params
+        self.resolution = resolution
+        self.times = {}
+        self.calls = {}
+        self.noise_calls = 0
+        self.noise_bytes = 0
+        self.reused = {}
+        self.nested = []
+        self.lock = threading.Lock()  # noise fields are counted from pool threads
+        self.t0 = time.perf_counter()
+        self.total = None
+
+    @contextmanager
+    def stage(self, name):
+        self.nested.append(0.0)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            inner = self.nested.pop()
+            if self.nested: self.nested[-1] += elapsed
+            self.times[name] = self.times.get(name, 0.0) + elapsed - inner
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count_noise(self, nbytes):
+        with self.lock:
+            self.noise_bytes += nbytes
+
+    def reuse(self, name):
+        with self.lock:
+            self.reused[name] = self.reused.get(name, 0) + 1
+
+    def finish(self):
+        self.total = time.perf_counter() - self.t0
+        return self
+
+    def summary(self):
+        """One line, slowest stages first, e.g. for a status bar."""
+        parts = [f"{name} {t * 1000:.0f}ms" for name, t in
+                 sorted(self.times.items(), key=lambda kv: -kv[1]) if t >= 0.0005]
+        total = f"{self.total * 1000:.0f}ms" if self.total is not None else "-"
+        return f"{total} | " + ", ".join(parts) + f" | noise x{self.noise_calls} {self.noise_bytes / 2**20:.1f}MB"
+
+    def to_dict(self):
+        p = self.params
+        return {"mode": p and p.mode, "width": p and p.width, "height": p and p.height,
+                "resolution": self.resolution, "total": self.total,
+                "stages": {name: {"seconds": round(t, 6), "calls": self.calls[name]}
+                           for name, t in self.times.items()},
+                "noise_calls": self.noise_calls, "noise_bytes": self.noise_bytes, "reused": self.reused}
+
+
+# Disabled stages share one no-op context, so instrumentation left in the hot
+# path costs an attribute check when nobody is listening.
+NO_STAGE = nullcontext()
+
+SUBSCRIBERS = []
+STATS_LOG = logging.getLogger("camo_engine.stats")
+
+
+def subscribe(fn):
+    """Call fn(RenderStats) after every render; renders are only timed while someone is subscribed."""
+    SUBSCRIBERS.append(fn)
+    return fn
+
+
+def unsubscribe(fn):
+    SUBSCRIBERS.remove(fn)
+
+
+def publish(stats):
+    for fn in list(SUBSCRIBERS):
+        fn(stats)
+
+
+def log_stats(stats):
+    """Subscriber that writes each render's stats as one JSON record to the camo_engine.stats logger."""
+    STATS_LOG.info(json.dumps(stats.to_dict()))
+
+
+def new_stats(params, resolution=1.0):
+    """A RenderStats to fill in, or None when nobody is subscribed."""
+    return RenderStats(params, resolution) if SUBSCRIBERS else None
+
+
+# --- NOISE THREADS ---
+# Independent noise fields of one render are generated concurrently; Pillow's
+# resize and the NumPy passes release the GIL. One pool per process, created
+# on first use (and again after a fork, whose child inherits no threads).
+NOISE_THREADS = os.cpu_count() or 1
+_noise_pool = None
+_noise_pool_pid = None
+_noise_pool_lock = threading.Lock()
+
+
+def set_noise_threads(n):
+    """Threads used for noise fields; 1 generates them serially on the calling thread."""
+    global NOISE_THREADS, _noise_pool
+    with _noise_pool_lock:
+        NOISE_THREADS = max(1, int(n))
+        if _noise_pool is not None and _noise_pool_pid == os.getpid():
+            _noise_pool.shutdown(wait=False)
+        _noise_pool = None
+
+
+def noise_pool():
+    global _noise_pool, _noise_pool_pid
+    if NOISE_THREADS < 2:
+        return None
+    with _noise_pool_lock:
+        if _noise_pool is None or _noise_pool_pid != os.getpid():
+            _noise_pool = ThreadPoolExecutor(NOISE_THREADS, thread_name_prefix="camo-noise")
+            _noise_pool_pid = os.getpid()
+        return _noise_pool
+
+
+# --- COMPILED KERNELS ---
+# Kryptek's web and Tiger's waves run as fused compiled kernels when Numba is
+# installed (camo_kernels); otherwise, or after set_kernels(False), in NumPy.
+# Tiger's kernel is float64 only: NumPy's SIMD float32 sin is both faster than
+# a scalar sinf loop and rounded differently from it.
+USE_KERNELS = camo_kernels.AVAILABLE
+
+
+def set_kernels(enabled):
+    """Use the compiled kernels (when available) or force the NumPy path."""
+    global USE_KERNELS
+    USE_KERNELS = bool(enabled) and camo_kernels.AVAILABLE
+
+
+# --- RENDER CONTEXTS ---
+# Scratch memory is kept per thread, for the last few output sizes rendered
+# (the GUI alternates between its preview and full-resolution sizes). Larger
+# scratch buffers are not kept: held for a whole one-shot render they would
+# raise its peak instead of saving allocations.
+CONTEXTS_PER_THREAD = 2
+SCRATCH_KEEP_BYTES = 32 * 1024 * 1024
+_contexts = threading.local()
+
+
+class RenderContext:
+    """Coordinate grids and scratch buffers for renders of one output size.
+
+    Engines take their temporaries from buffer() and write into them with
+    out=, so back-to-back renders at the same size (slider drags in the GUI,
+    the bands of a banded render, a batch of same-size jobs) reuse the same
+    memory instead of allocating afresh. A buffer's contents are only valid
+    until the next request for the same name, so stage results that get
+    cached or returned are never taken from here. Grids are read-only.
+    """
+    def __init__(self, out_w, out_h):
+        self.size = (out_w, out_h)
+        self.buffers = {}
+        self.grids = {}
+
+    def buffer(self, name, shape, dtype=np.float64):
+        buf = self.buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            if buf.nbytes <= SCRATCH_KEEP_BYTES:
+                self.buffers[name] = buf
+            else:
+                self.buffers.pop(name, None)
+        return buf
+
+    def grid(self, key, make):
+        if key not in self.grids:
+            grid = make()
+            grid.flags.writeable = False
+            self.grids[key] = grid
+        return self.grids[key]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (*self.buffers.values(), *self.grids.values()))
+
+
+def render_context(out_w, out_h):
+    """This thread's RenderContext for out_w x out_h renders."""
+    contexts = getattr(_contexts, "by_size", None)
+    if contexts is None:
+        contexts = _contexts.by_size = OrderedDict()
+    key = (out_w, out_h)
+    if key in contexts:
+        contexts.move_to_end(key)
+    else:
+        contexts[key] = RenderContext(out_w, out_h)
+        while len(contexts) > CONTEXTS_PER_THREAD:
+            contexts.popitem(last=False)
+    return contexts[key]
+
+
+def clear_render_contexts():
+    """Drop this thread's render contexts and the scratch memory they hold."""
+    _contexts.by_size = OrderedDict()
+
+
+def field_seed(seed_offset, scale, seed_add):
+    """Seed of the random stream behind one noise field.
+
+    Each (seed_offset, int(scale), seed_add) gets its own Generator stream, so
+    fields never share global RNG state and can be drawn in any order or on
+    any thread with the same result.
+    """
+    return np.random.SeedSequence([int(v) % (1 << 32) for v in (seed_offset, int(scale), seed_add)])
+
+
+class CamoEngine:
+    """Renders a RenderParams into a label map or an RGB array.
+
+    Each algo_* method records its layer masks with `paint` into a per-pixel
+    bitmask; colours and layer toggles are applied afterwards through small
+    lookup tables. The scalar maps behind the masks come from `cached`, so a
+    colour or layer edit costs one table lookup.
+
+    `resolution` samples the same pattern on a coarser (or finer) pixel grid:
+    the algorithms keep working in full-size coordinates and only the output
+    arrays shrink, which is what the interactive preview renders with.
+    `should_cancel` is polled between stages; when it returns True the render
+    stops with RenderCancelled. Stage timings go to `stats` (a RenderStats)
+    when one is given.
+    """
+    def __init__(self, params, use_cache=True, resolution=1.0, should_cancel=None, stats=None):
+        if params.precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}, got {params.precision!r}")
+        self.params = params
+        self.dtype = np.float32 if params.precision == "float32" else np.float64
+        self.colors = params.colors
+        self.layer_vars = params.layers
+        self.resolution = resolution
+        self.out_w, self.out_h = output_size(params, resolution)
+        self.ctx = render_context(self.out_w, self.out_h)
+        self.should_cancel = should_cancel
+        self.rows = np.arange(self.out_h)
+        # The seed offsets whose noise a render reads: two, blended by
+        # morph_noise, part way through a seed morph.
+        self.morph = min(max(params.morph, 0.0), 1.0)
+        if self.morph <= 0.0:
+            self.noise_seeds = (params.seed_offset,)
+        elif self.morph >= 1.0:
+            self.noise_seeds = (params.morph_seed,)
+        else:
+            self.noise_seeds = (params.seed_offset, params.morph_seed)
+        self.seed_key = self.noise_seeds + ((self.morph,) if len(self.noise_seeds) > 1 else ())
+        # Per-pixel white noise (Tiger micro noise) comes from a private stream
+        # seeded like the noise fields, so a render never depends on whatever
+        # the global RNG state was.
+        self.white_seeds = [field_seed(seed, params.scale, WHITE_NOISE_SEED) for seed in self.noise_seeds]
+        self.lattices = {}
+        self.use_cache = use_cache
+        self.stats = stats
+
+    def full_frame(self):
+        return len(self.rows) == self.out_h
+
+    def check_cancel(self):
+        if self.should_cancel is not None and self.should_cancel():
+            raise RenderCancelled()
+
+    def stage(self, name):
+        """Context that times `name` into self.stats; a shared no-op when not instrumented."""
+        return NO_STAGE if self.stats is None else self.stats.stage(name)
+
+    def cached(self, name, deps, make):
+        """Stage result `make()`, reused while the seed, size and `deps` are unchanged."""
+        self.check_cancel()
+        computed = []
+        def timed():
+            computed.append(name)
+            with self.stage(name):
+                return make()
+        if not (self.use_cache and self.full_frame()):
+            return timed()
+        p = self.params
+        key = (p.mode, name, p.width, p.height, self.resolution, p.tileable, p.precision,
+               p.scale, self.seed_key) + tuple(deps)
+        value = STAGE_CACHE.get(key, timed)
+        if not computed and self.stats is not None:
+            self.stats.reuse(name)
+        return value
+
+    def get_noise(self, h, w, scale, stretch_x=1.0, stretch_y=1.0, seed_add=0, rows=None):
+        """Noise field for a full-size h x w canvas, sampled on the engine's output grid."""
+        self.check_cancel()
+        if self.stats is not None:
+            self.stats.noise_calls += 1
+        with self.stage("noise"):
+            return self.noise_field(h, w, scale, stretch_x, stretch_y, seed_add, rows)
+
+    def get_noise_stack(self, h, w, scale, seed_adds, stretch_x=1.0, stretch_y=1.0, rows=None):
+        """(N, rows, out_w) stack of noise fields, one per seed_add, sharing one
+        lattice geometry and upsampled together."""
+        self.check_cancel()
+        if self.stats is not None:
+            self.stats.noise_calls += 1
+        with self.stage("noise"):
+            return self.noise_stack(h, w, scale, seed_adds, stretch_x, stretch_y, rows)
+
+    def noise_fields(self, h, w, *specs):
+        """Several noise requests at once, generated concurrently on the noise thread
+        pool: one dict of get_noise keywords per field, or of get_noise_stack
+        keywords (with `seed_adds`) per stack."""
+        self.check_cancel()
+        if self.stats is not None:
+            self.stats.noise_calls += len(specs)
+
+        def run(spec):
+            if "seed_adds" in spec:
+                return self.noise_stack(h, w, **spec)
+            return self.noise_field(h, w, **spec)
+        with self.stage("noise"):
+            pool = noise_pool()
+            if pool is None or len(specs) < 2:
+                return [run(spec) for spec in specs]
+            futures = [pool.submit(run, spec) for spec in specs]
+            return [f.result() for f in futures]
+
+    def noise_field(self, h, w, scale, stretch_x=1.0, stretch_y=1.0, seed_add=0, rows=None):
+        return self.noise_stack(h, w, scale, (seed_add,), stretch_x, stretch_y, rows)[0]
+
+    def noise_stack(self, h, w, scale, seed_adds, stretch_x=1.0, stretch_y=1.0, rows=None):
+        stacks = [self.seed_noise_stack(seed_offset, h, w, scale, seed_adds, stretch_x, stretch_y, rows)
+                  for seed_offset in self.noise_seeds]
+        return stacks[0] if len(stacks) == 1 else morph_noise(*stacks, self.morph)
+
+    def seed_noise_stack(self, seed_offset, h, w, scale, seed_adds, stretch_x=1.0, stretch_y=1.0, rows=None):
+        rows = self.rows if rows is None else rows
+        p = self.params
+        seeds = [(seed_offset, int(p.scale), seed_add) for seed_add in seed_adds]
+        safe_scale = max(1.0, scale)
+        oh, ow = self.out_h, self.out_w
+        if self.params.tileable:
+            # A whole number of lattice cells per repeat, wrapped at the edges,
+            # so the upsampled field is periodic over the output size.
+            gh = max(1, int(round(h / (safe_scale * stretch_y))))
+            gw = max(1, int(round(w / (safe_scale * stretch_x))))
+            # The filter reaches further when the lattice is downsampled.
+            pad = max(TILE_PAD, int(np.ceil(2 * max(gh / oh, gw / ow))) + 1)
+            box = (pad, pad, pad + gw, pad + gh)
+        else:
+            gh = int(h / (safe_scale * stretch_y)) + 2
+            gw = int(w / (safe_scale * stretch_x)) + 2
+            pad, box = 0, None
+        if len(rows) < oh:
+            lattices = np.stack([self.get_lattice(seed, gh, gw, pad) for seed in seeds])
+            return self.count_noise(unit_noise(resample_rows(lattices, oh, ow, rows, box)))
+
+        computed = []
+        def make():
+            computed.append(True)
+            lattices = np.stack([make_lattice(seed, gh, gw, pad, p.precision) for seed in seeds])
+            return self.count_noise(unit_noise(upsample(lattices, ow, oh, box)))
+        if not self.use_cache:
+            return make()
+        key = (h, w, oh, ow, scale, stretch_x, stretch_y, seed_offset, int(p.scale),
+               tuple(seed_adds), p.tileable, p.precision)
+        value = NOISE_CACHE.get(key, make)
+        if not computed and self.stats is not None:
+            self.stats.reuse("noise")
+        return value
+
+    def count_noise(self, noise):
+        if self.stats is not None:
+            self.stats.count_noise(noise.nbytes)
+        return noise
+
+    def get_lattice(self, seed, gh, gw, pad=0):
+        """The noise lattice get_noise would upsample, kept for reuse across bands."""
+        key = (seed, gh, gw, pad)
+        if key not in self.lattices:
+            self.lattices[key] = make_lattice(seed, gh, gw, pad, self.params.precision)
+        return self.lattices[key]
+
+    def coords(self, size, out_size):
+        """Full-size coordinate of each output sample along one axis (read-only)."""
+        def make():
+            if self.params.tileable:
+                # Sample spacing of exactly size / out_size, so coordinate `size` wraps to 0.
+                return (np.arange(out_size) * (size / out_size)).astype(self.dtype, copy=False)
+            return np.linspace(0, size, out_size, dtype=self.dtype)
+        return self.ctx.grid(("coords", size, out_size, self.params.tileable, self.dtype), make)
+
+    def scratch(self, name, shape=None, dtype=None):
+        """Scratch array from the render context, by default one row-band of the
+        engine's dtype. Contents are undefined; never cache or return one."""
+        shape = shape or (len(self.rows), self.out_w)
+        return self.ctx.buffer(name, shape, dtype or self.dtype)
+
+    def above(self, field, thresh, name="mask"):
+        """field > thresh as a scratch mask, for paint."""
+        return np.greater(field, thresh, out=self.scratch(name, field.shape, bool))
+
+    def wave_freq(self, freq, period, factor=1.0):
+        """`freq`, nudged in tileable mode so a wave of freq * factor repeats over `period`."""
+        if not self.params.tileable:
+            return freq
+        cycles = max(1, int(round(freq * factor * period / (2 * np.pi))))
+        return 2 * np.pi * cycles / (factor * period)
+
+    def white_noise(self, rows, w, out=None):
+        """Uniform noise for the given output rows, w samples each, written into
+        `out` when given.
+
+        Row r is always draws r*w .. r*w + w - 1 of one stream (PCG64 can jump
+        ahead), so any band or subset of rows matches the full-frame noise.
+        """
+        dest = out
+        if out is None or out.dtype != np.float64:
+            out = np.empty((len(rows), w))
+        starts = np.flatnonzero(np.diff(rows) != 1) + 1
+
+        def fill(seed, out):
+            for i0, run in zip(np.r_[0, starts], np.split(rows, starts)):
+                bitgen = np.random.PCG64(seed)
+                bitgen.advance(int(run[0]) * w)
+                np.random.Generator(bitgen).random(out=out[i0:i0 + len(run)])
+            return out
+        fill(self.white_seeds[0], out)
+        if len(self.white_seeds) > 1:
+            out = morph_noise(out, fill(self.white_seeds[1], np.empty_like(out)), self.morph)
+        if dest is None:
+            return out.astype(self.dtype, copy=False)
+        if dest is not out:
+            np.copyto(dest, out)
+        return dest
+
+    def paint(self, mask, role, toggle=None):
+        """Paint step: `mask` shows `role`'s colour while layer `toggle` (default `role`) is on."""
+        bit = len(self.steps)
+        with self.stage("paint"):
+            np.bitwise_or(self.codes, np.uint8(1 << bit), out=self.codes, where=mask)
+        self.steps.append((ROLES.index(role), ROLES.index(toggle or role)))
+
+    def generate_codes(self, rows=None):
+        """Paint-step bitmask per pixel for the given rows (all by default), and the
+        (role, toggle) of each bit as a uint8 array.
+
+        Bit i is set where step i painted. Later steps cover earlier ones, but
+        which steps show is left to label_lut, so the map is independent of the
+        colours and layer toggles.
+        """
+        p = self.params
+        mode = p.mode
+        w, h = p.width, p.height
+        if rows is not None:
+            self.rows = np.asarray(rows)
+
+        scale = p.scale
+        dist = p.distortion
+        feat_a = p.feat_a
+        feat_b = p.feat_b
+
+        def get_cutoff(density_int): return 1.0 - (density_int / 10.0)
+        t1 = get_cutoff(round(p.thresh1))
+        t2 = get_cutoff(round(p.thresh2))
+        t3 = get_cutoff(round(p.thresh3))
+
+        return self.cached("codes", (dist, feat_a, feat_b, t1, t2, t3),
+                           lambda: self.run_engine(mode, w, h, scale, dist, feat_a, feat_b, t1, t2, t3))
+
+    def run_engine(self, mode, w, h, scale, dist, feat_a, feat_b, t1, t2, t3):
+        self.codes = np.zeros((len(self.rows), self.out_w), dtype=np.uint8)
+        self.steps = []
+        if mode == "Kryptek Inspired":
+            self.algo_kryptek_v11(w, h, scale, dist, feat_a, feat_b, t1, t2, t3)
+        elif mode == "Tiger Stripe Inspired":
+            self.algo_tiger(w, h, scale, dist, feat_a, feat_b, t1, t2, t3)
+        elif mode in ["M81 Woodland Inspired", "Puzzle Inspired"]:
+            self.algo_woodland_family(w, h, scale, dist, feat_a, feat_b, t1, t2, t3)
+        elif mode == "British DPM Inspired":
+            self.algo_dpm(w, h, scale, dist, feat_a, feat_b, t1, t2, t3)
+        elif mode == "Flecktarn Inspired":
+            self.algo_flecktarn(w, h, scale, dist, feat_a, feat_b, t1, t2, t3)
+        elif mode == "Chocolate Chip Inspired":
+            self.algo_chocolate(w, h, scale, dist, feat_a, feat_b, t1, t2, t3)
+        elif mode == "British Brush Stroke Inspired":
+            self.algo_brush_v2(w, h, scale, dist, feat_a, feat_b, t1, t2, t3)
+        elif "Lizard" in mode:
+            self.algo_lizard_v2(w, h, scale, dist, feat_a, feat_b, t1, t2, t3)
+        else:
+            raise ValueError(f"Unknown pattern mode: {mode!r}")
+        return self.codes, np.array(self.steps, dtype=np.uint8)
+
+    def generate_labels(self, rows=None):
+        """Role index per pixel (0 = base, 1-3 = layer1-3) with layer toggles applied."""
+        codes, steps = self.generate_codes(rows)
+        with self.stage("composite"):
+            return label_lut(steps, self.layer_vars)[codes]
+
+    def generate_pattern(self, rows=None):
+        """Render the given output rows (all of them by default) to an RGB array."""
+        return palette_array(self.colors)[self.generate_labels(rows)]
+
+    # --- ALGORITHM: KRYPTEK V11 (TRIANGLE WAVE) ---
+    def algo_kryptek_v11(self, w, h, scale, dist, fade_amt, line_thick, t1, t2, t3):
+        bg_noise = self.get_noise(h, w, scale * 3.0, seed_add=100)
+
+        final_grid, shadow_grid = self.cached("web", (dist, fade_amt, line_thick),
+            lambda: self.kryptek_web(w, h, scale, dist, fade_amt, line_thick))
+
+        self.paint(self.above(bg_noise, 0.5), "layer1")
+        self.paint(shadow_grid, "layer3")
+        self.paint(final_grid, "layer2")
+
+    def kryptek_web(self, w, h, scale, dist, fade_amt, line_thick):
+        # The shadow is the web shifted down/right by `offset`, wrapping at the
+        # edges like np.roll. Evaluate the web on both the output rows and the
+        # rows the shadow is taken from, so a band of rows renders on its own.
+        offset = max(1, int(round(15 * self.resolution)))
+        shadow_src = (self.rows - offset) % self.out_h
+        grid_rows = np.union1d(self.rows, shadow_src)
+
+        x = self.coords(w, self.out_w).reshape(1, -1)
+        y = self.coords(h, self.out_h)[grid_rows].reshape(-1, 1)
+
+        warp, fade_mask_noise = self.get_noise_stack(h, w, scale * 4.0, (200, 555), rows=grid_rows)
+        shape = warp.shape
+        fade_cutoff = fade_amt / 40.0
+        freq = scale / 500.0
+        freq_x = self.wave_freq(freq, w, 0.5)
+        freq_y = self.wave_freq(freq, h, 0.866)
+        cell_thresh = 0.4 + (line_thick / 50.0) * 0.4
+        if USE_KERNELS:
+            web_grid = camo_kernels.kryptek_web(x.ravel(), y.ravel(), warp, fade_mask_noise, dist,
+                                                freq_x, freq_y, cell_thresh, fade_cutoff)
+            return self.kryptek_shadow(web_grid, grid_rows, shadow_src, offset)
+        # Threshold the fade field up front so the noise stack can be freed
+        # before the wave math.
+        visible_mask = self.above(fade_mask_noise, fade_cutoff, "visible")
+        del fade_mask_noise
+        # Two scratch buffers carry the coordinates: "x" holds x_dist, then
+        # x_dist * freq_x, then v1; "y" holds the warp, then y_dist.
+        warp = np.multiply(warp, dist, out=self.scratch("y", shape))
+        x_dist = np.add(x, warp, out=self.scratch("x", shape))
+        y_dist = np.add(warp, y, out=warp)
+
+        # TRIANGLE WAVE FUNCTION: Creates linear gradients (straight lines)
+        # Standard Cosine creates curved gradients (circles).
+        def tri(t):
+            # Maps periodic input to -1.0 ... 1.0 in a linear zig-zag
+            # (in place: every argument below is a scratch buffer)
+            t /= np.pi
+            t %= 2.0
+            t -= 1.0
+            np.abs(t, out=t)
+            t *= 2.0
+            t -= 1.0
+            return t
+
+        # 3-Axis Triangle Wave Interference
+        x_freq = np.multiply(x_dist, freq_x, out=x_dist)
+        y_freq = np.multiply(y_dist, freq_y, out=y_dist)
+        y_freq *= 0.866
+        x_half = np.multiply(x_freq, -0.5, out=self.scratch("v2", shape))
+        v3 = tri(np.subtract(x_half, y_freq, out=self.scratch("v3", shape)))
+        v2 = tri(np.add(x_half, y_freq, out=x_half))
+        v1 = tri(x_freq)
+
+        # Sum them up
+        # The interference of linear gradients creates polygonal shapes.
+        raw_hex = v1
+        raw_hex += v2
+        raw_hex += v3
+
+        # Normalize (roughly -3 to +3 -> 0 to 1)
+        raw_hex += 3.0
+        raw_hex /= 6.0
+
+        # CELL LOGIC (Peaks)
+        cell_mask = self.above(raw_hex, cell_thresh, "cells")
+        web_mask = np.logical_not(cell_mask, out=cell_mask)
+
+        web_grid = np.logical_and(web_mask, visible_mask, out=web_mask)
+        return self.kryptek_shadow(web_grid, grid_rows, shadow_src, offset)
+
+    def kryptek_shadow(self, web_grid, grid_rows, shadow_src, offset):
+        """(web, shadow) on the output rows from the web on grid_rows."""
+        final_grid = web_grid[np.searchsorted(grid_rows, self.rows)]
+        shadow_grid = web_grid[np.searchsorted(grid_rows, shadow_src)]
+        shadow_grid = np.roll(shadow_grid, offset, axis=1)
+        return final_grid, shadow_grid
+
+    def algo_lizard_v2(self, w, h, scale, dist, stretch, breakage, t1, t2, t3):
+        def maps():
+            base_stretch = max(1.0, stretch / 2.0)
+            scratch_scale = max(1.0, scale / 4.0)
+            scratch_stretch = max(5.0, stretch * 2.0)
+            blobs, scratches, warp = self.noise_fields(h, w,
+                dict(scale=scale, stretch_x=base_stretch, seed_add=100),
+                dict(scale=scratch_scale, stretch_x=scratch_stretch, seed_add=200),
+                dict(scale=scale * 2.0, seed_add=300))
+            lizard_map = scratches * 0.7
+            lizard_map += 0.3
+            lizard_map *= blobs
+            lizard_map += np.multiply(warp, dist / 100.0, out=self.scratch("warp"))
+            return lizard_map, lizard_map * scratches
+        lizard_map, l3_map = self.cached("lizard_map", (dist, stretch), maps)
+        self.paint(self.above(lizard_map, t1), "layer1")
+        self.paint(self.above(lizard_map, t2 + 0.1), "layer2")
+        self.paint(self.above(l3_map, t3 + 0.15), "layer3")
+
+    def algo_brush_v2(self, w, h, scale, dist, stretch, bristle_tex, t1, t2, t3):
+        def maps():
+            stroke_scale = scale * 2.0
+            stroke_stretch = max(4.0, stretch + 2.0)
+            bristle_scale = max(1.0, scale / 5.0)
+            strokes, bristles, warp = self.noise_fields(h, w,
+                dict(scale=stroke_scale, stretch_x=stroke_stretch, seed_adds=(10, 20, 30)),
+                dict(scale=bristle_scale, stretch_x=stroke_stretch*1.5, seed_add=99),
+                dict(scale=scale * 3.0, seed_add=500))
+            bristle_mix = bristle_tex / 50.0
+            texture_mask = np.multiply(bristles, bristle_mix, out=self.scratch("texture"))
+            texture_mask += 1.0 - bristle_mix
+            warp = np.multiply(warp, dist / 150.0, out=self.scratch("warp"))
+            finals = []
+            for stroke in strokes:
+                final = stroke * texture_mask
+                final += warp
+                finals.append(final)
+            return tuple(finals)
+        s1_final, s2_final, s3_final = self.cached("strokes", (dist, stretch, bristle_tex), maps)
+        self.paint(self.above(s1_final, t1), "layer1")
+        self.paint(self.above(s2_final, t2), "layer2")
+        self.paint(self.above(s3_final, t3), "layer3")
+
+    def algo_tiger(self, w, h, scale, dist, stretch, jagged, t1, t2, t3):
+        freq1 = self.wave_freq(scale / 250.0, h)
+        freq2 = self.wave_freq(scale / 250.0 * 1.2, h)
+
+        def waves():
+            flow_map, pinch1, pinch2 = self.noise_fields(h, w,
+                dict(scale=scale*2, stretch_x=stretch, seed_add=10),
+                dict(scale=scale, stretch_x=stretch/2, seed_add=20),
+                dict(scale=scale, stretch_x=stretch, seed_add=30))
+            y_grid = self.coords(h, self.out_h)[self.rows].reshape(-1, 1)
+            distorted_y = self.white_noise(self.rows, self.out_w, out=self.scratch("distorted_y"))
+            if USE_KERNELS and self.dtype == np.float64:
+                return camo_kernels.tiger_waves(distorted_y, y_grid.ravel(), flow_map, pinch1, pinch2,
+                                                jagged, dist, freq1, freq2)
+            distorted_y *= jagged
+            distorted_y += y_grid
+            distorted_y += np.multiply(flow_map, dist, out=self.scratch("flow"))
+
+            def wave(freq, phase, pinch):
+                out = distorted_y * freq
+                if phase: out += phase
+                np.sin(out, out=out)
+                amp = np.subtract(pinch, 0.5, out=self.scratch("amp"))
+                amp *= 1.2
+                amp += 1
+                out *= amp
+                return out
+            return wave(freq1, 0.0, pinch1), wave(freq2, 1.0, pinch2)
+        wave1, wave2 = self.cached("waves", (dist, stretch, jagged), waves)
+        self.paint(self.above(wave1, t1), "layer1")
+        self.paint(self.above(wave2, t2), "layer2")
+        self.paint(self.above(wave2, t3 + 0.15), "layer3")
+
+    def algo_dpm(self, w, h, scale, dist, stretch, rough, t1, t2, t3):
+        def maps():
+            base_scale = scale * 2.0
+            warp_x, stipple, layers = self.noise_fields(h, w,
+                dict(scale=scale * 3, seed_add=50),
+                dict(scale=3.0, seed_add=777),
+                dict(scale=base_scale, seed_adds=(100, 200, 300)))
+            offset = np.multiply(warp_x, dist, out=self.scratch("offset"))
+            offset *= 0.01
+            offset += np.multiply(stipple, rough / 15.0, out=self.scratch("stipple"))
+            return tuple(layers + offset)
+        n1, n2, n3 = self.cached("dpm_maps", (dist, rough), maps)
+        self.paint(self.above(n1, t1), "layer1")
+        self.paint(self.above(n2, t2), "layer2")
+        self.paint(self.above(n3, t3), "layer3")
+
+    def algo_woodland_family(self, w, h, scale, dist, blob_size, roughness, t1, t2, t3):
+        if self.params.mode == "Puzzle Inspired": roughness = 0.5
+
+        def maps():
+            base_scale = scale * (blob_size / 2.0)
+            layers, turb = self.noise_fields(h, w,
+                dict(scale=base_scale, seed_adds=(100, 200, 300)),
+                dict(scale=scale/2, seed_add=400))
+            turb = np.multiply(turb, roughness / 10.0, out=self.scratch("turb"))
+            return tuple(layers + turb)
+        n1, n2, n3 = self.cached("woodland_maps", (blob_size, roughness), maps)
+        self.paint(self.above(n1, t1), "layer1")
+        self.paint(self.above(n2, t2), "layer2")
+        self.paint(self.above(n3, t3), "layer3")
+
+    def algo_chocolate(self, w, h, scale, dist, blob_size, chip_size, t1, t2, t3):
+        self.algo_woodland_family(w, h, scale, dist, blob_size, 20.0, t1, t2, t3)
+        # Chips use the layer2/layer3 colours but are switched by layer2 alone.
+        chip_scale = scale / 4.0
+        chips = self.get_noise(h, w, chip_scale, seed_add=999)
+        self.paint(self.above(chips, t3), "layer2", toggle="layer2")
+        self.paint(self.above(chips, t3 + 0.05), "layer3", toggle="layer2")
+
+    def algo_flecktarn(self, w, h, scale, dist, density, dot_size, t1, t2, t3):
+        def regions():
+            region_scale = scale * 2.5
+            regions, mix = self.noise_fields(h, w,
+                dict(scale=region_scale, seed_adds=(500, 600, 700)),
+                dict(scale=scale, seed_add=800))
+            mix = np.multiply(mix, dist / 100.0, out=self.scratch("mix"))
+            return tuple(regions + mix)
+        reg1, reg2, reg3 = self.cached("regions", (dist,), regions)
+        dot_scale = max(2.0, dot_size)
+        dots = self.get_noise(h, w, dot_scale, seed_add=900)
+        dot_thresh = 1.0 - (density / 18.0)
+        dot_mask = self.above(dots, dot_thresh, "dots")
+        for role, region, thresh in (("layer1", reg1, t1), ("layer2", reg2, t2), ("layer3", reg3, t3)):
+            mask = self.above(region, thresh)
+            self.paint(np.logical_and(mask, dot_mask, out=mask), role)
+
+
+class DigitalEngine:
+    """Digital (pixelated) render evaluated directly on its block grid.
+
+    The pattern is sampled once per `block_size` x `block_size` block, i.e. a
+    CamoEngine at resolution / block_size, and blocks are only expanded to
+    pixels at export (expand_blocks). With `macro_block_size` set, layer 1 is
+    taken from a second, coarser grid and the other layers from the fine one,
+    mixing two pixel sizes the way MARPAT does.
+    """
+    def __init__(self, params, use_cache=True, resolution=1.0, should_cancel=None, stats=None):
+        if params.block_size < 1 or params.macro_block_size < 0:
+            raise ValueError(f"bad block sizes: {params.block_size}, {params.macro_block_size}")
+        self.params = params
+        self.fine = CamoEngine(params, use_cache, resolution / params.block_size, should_cancel, stats)
+        self.macro = None
+        if params.macro_block_size:
+            self.macro = CamoEngine(params, use_cache, resolution / params.macro_block_size,
+                                    should_cancel, stats)
+        self.out_w, self.out_h = self.fine.out_w, self.fine.out_h
+        self.layer_vars = params.layers
+        self.colors = params.colors
+
+    def stage(self, name):
+        return self.fine.stage(name)
+
+    def generate_codes(self, rows=None):
+        """Paint-step bitmask per block for the given block-grid rows (all by default)."""
+        codes, steps = self.fine.generate_codes(rows)
+        if self.macro is None:
+            return codes, steps
+        rows = self.fine.rows
+        with self.stage("macro"):
+            mx = expand_index(self.out_w, self.macro.out_w)
+            my, inverse = np.unique(expand_index(self.out_h, self.macro.out_h)[rows], return_inverse=True)
+        macro_codes, _ = self.macro.generate_codes(my)
+        with self.stage("macro"):
+            bits = sum(1 << i for i, (role, _) in enumerate(steps) if role == ROLES.index("layer1"))
+            macro_codes = macro_codes[inverse][:, mx]
+            codes = (macro_codes & np.uint8(bits)) | (codes & np.uint8(~bits & 0xFF))
+        return codes, steps
+
+    def generate_labels(self, rows=None):
+        codes, steps = self.generate_codes(rows)
+        with self.stage("composite"):
+            return label_lut(steps, self.layer_vars)[codes]
+
+    def generate_pattern(self, rows=None):
+        return palette_array(self.colors)[self.generate_labels(rows)]
+
+
+def make_engine(params, use_cache=True, resolution=1.0, should_cancel=None, stats=None):
+    """CamoEngine, or DigitalEngine for digital params."""
+    cls = DigitalEngine if params.digital else CamoEngine
+    return cls(params, use_cache, resolution, should_cancel, stats)
+
+
+def label_lut(steps, layers):
+    """Role index shown for every paint-step bitmask, given the layer toggles."""
+    lut = np.zeros(1 << len(steps), dtype=np.uint8)
+    codes = np.arange(len(lut))
+    for bit, (role, toggle) in enumerate(steps):
+        if layers[ROLES[toggle]]:
+            lut[(codes >> bit) & 1 == 1] = role
+    return lut
+
+
+def palette_array(colors):
+    """(4, 3) uint8 palette indexed by role: base, layer1, layer2, layer3."""
+    return np.array([hex2rgb(colors[role]) for role in ROLES], dtype=np.uint8)
+
+
+def render_labels(params, resolution=1.0, should_cancel=None, stats=None, expand=True):
+    """Render params to an (h, w) uint8 map of role indices.
+
+    With resolution < 1 the map is a cheaper, smaller sampling of the same
+    pattern (h * resolution rows), e.g. for a preview. Digital params render
+    one label per block; expand=False returns that block grid as is, otherwise
+    it is expanded to pixels. Stage timings go to `stats` if given; otherwise,
+    while anyone is subscribed, the render is timed and published on its own.
+    """
+    own = stats is None
+    if own:
+        stats = new_stats(params, resolution)
+    engine = make_engine(params, resolution=resolution, should_cancel=should_cancel, stats=stats)
+    labels = engine.generate_labels()
+    if params.digital and expand:
+        with engine.stage("digital"):
+            labels = expand_blocks(labels, *output_size(params, resolution))
+    if own and stats is not None:
+        publish(stats.finish())
+    return labels
+
+
+def render_array(params, resolution=1.0, should_cancel=None, stats=None, expand=True):
+    """Render params to an (h, w, 3) uint8 RGB array."""
+    return palette_array(params.colors)[render_labels(params, resolution, should_cancel, stats, expand)]
+
+
+def render_image(params, resolution=1.0, should_cancel=None, stats=None, expand=True):
+    """Render params to a PIL "P" image; recolour it with set_palette, no per-pixel work."""
+    img = Image.fromarray(render_labels(params, resolution, should_cancel, stats, expand))
+    set_palette(img, params.colors)
+    return img
+
+
+def output_size(params, resolution=1.0):
+    """(width, height) in pixels of a render at `resolution`."""
+    return (max(1, int(round(params.width * resolution))),
+            max(1, int(round(params.height * resolution))))
+
+
+def set_palette(img, colors):
+    img.putpalette(palette_array(colors).tobytes())
+
+
+def repeat_metadata(params):
+    """Text tags describing a render: its repeat size (tileable only) and params as JSON."""
+    meta = {"camo:params": json.dumps(params.to_dict(), sort_keys=True)}
+    if params.tileable:
+        meta["camo:repeat"] = f"{params.width}x{params.height}"
+    return meta
+
+
+def save_image(img, path, params=None):
+    """Save img, embedding repeat_metadata(params) as PNG text chunks or a TIFF ImageDescription."""
+    ext = path.lower().rsplit(".", 1)[-1]
+    if ext in ("jpg", "jpeg") and img.mode != "RGB":
+        img = img.convert("RGB")  # JPEG has no palette mode
+    if params is None:
+        return img.save(path)
+    meta = repeat_metadata(params)
+    if ext == "png":
+        info = PngImagePlugin.PngInfo()
+        for key, val in meta.items():
+            info.add_text(key, val)
+        img.save(path, pnginfo=info)
+    elif ext in ("tif", "tiff"):
+        img.save(path, tiffinfo={270: json.dumps(meta)})
+    else:
+        img.save(path)
+
+
+def expand_index(n_out, n_in):
+    """Block index of every output pixel along one axis when n_in blocks are
+    expanded to n_out pixels, as a NEAREST resize places them."""
+    idx = Image.fromarray(np.arange(n_in, dtype=np.int32).reshape(1, n_in), "I")
+    return np.array(idx.resize((n_out, 1), resample=Image.NEAREST))[0]
+
+
+def expand_blocks(grid, width, height):
+    """Expand a block grid (labels or RGB) to width x height pixels."""
+    return grid[expand_index(height, grid.shape[0])][:, expand_index(width, grid.shape[1])]
+
+
+# --- NOISE LATTICES ---
+# Wrapped border around a tileable lattice; covers the bicubic filter's reach.
+TILE_PAD = 3
+# seed_add of the per-pixel white noise stream; no noise field uses it.
+WHITE_NOISE_SEED = 1 << 20
+# "uint8" upsamples an 8-bit lattice and works in float64 from there (the
+# original engine); "float32" stays in float32 end to end, with no 1/255 steps.
+PRECISIONS = ("uint8", "float32")
+
+
+def unit_noise(field):
+    """An upsampled lattice as unit noise: uint8 -> float64 / 255; float32 as is
+    (an "F" resize is not clipped, so it can overshoot [0, 1] slightly)."""
+    if field.dtype != np.uint8:
+        return field
+    out = field.astype(np.float64, order="C")
+    out /= 255.0
+    return out
+
+
+def morph_noise(a, b, t):
+    """Unit noise part way (t in 0..1) from field a to field b.
+
+    Deviations from 0.5 are mixed with weights cos/sin(t * pi / 2), which keeps
+    the variance of two independent fields constant, so the layer coverage
+    holds steady while the shapes morph.
+    """
+    c, s = float(np.cos(t * np.pi / 2)), float(np.sin(t * np.pi / 2))
+    out = np.multiply(a, c)
+    out += np.multiply(b, s)
+    out += 0.5 * (1.0 - c - s)
+    return out
+
+
+def make_lattice(seed, gh, gw, pad=0, precision="uint8"):
+    """Random lattice for the noise field with `seed` = (seed_offset, int(scale),
+    seed_add), optionally wrap-padded by `pad` cells: uint8 values 0-254, or for
+    precision="float32" the same draws as float32 / 255, so both precisions
+    render the same pattern."""
+    rng = np.random.default_rng(field_seed(*seed))
+    lattice = rng.integers(0, 255, size=(gh, gw), dtype=np.uint8)
+    if precision == "float32":
+        lattice = lattice.astype(np.float32)
+        lattice /= 255.0
+    if pad:
+        lattice = np.pad(lattice, pad, mode="wrap")
+    return lattice
+
+
+# --- ROW-WISE BICUBIC ---
+# Pillow's BICUBIC resize runs a horizontal pass then a vertical pass in 22-bit
+# fixed point. Re-doing the vertical pass here with the same coefficients lets
+# any subset of output rows be produced bit-identically to a full resize, so
+# banded renders have no seams.
+PRECISION_BITS = 32 - 8 - 2
+
+
+def _bicubic_filter(x):
+    a = -0.5
+    x = np.abs(x)
+    near = ((a + 2.0) * x - (a + 3.0)) * x * x + 1
+    far = (((x - 5) * x + 8) * x - 4) * a
+    return np.where(x < 1.0, near, np.where(x < 2.0, far, 0.0))
+
+
+def bicubic_coeffs(in_size, out_size, in0=0, in1=None, fixed=True):
+    """(bounds_min, bounds_len, kernel) per output pixel, as Pillow computes them
+    when resizing source span [in0, in1) to out_size. The kernel is in 22-bit
+    fixed point (8-bit images) or, with fixed=False, double (float images)."""
+    in1 = in_size if in1 is None else in1
+    scale = (in1 - in0) / out_size
+    filterscale = max(scale, 1.0)
+    support = 2.0 * filterscale
+    ksize = int(np.ceil(support)) * 2 + 1
+    center = in0 + (np.arange(out_size) + 0.5) * scale
+    xmin = np.maximum(np.trunc(center - support + 0.5).astype(np.int64), 0)
+    xmax = np.minimum(np.trunc(center + support + 0.5).astype(np.int64), in_size) - xmin
+    taps = np.arange(ksize)
+    kk = _bicubic_filter((taps + xmin[:, None] - center[:, None] + 0.5) * (1.0 / filterscale))
+    kk[taps >= xmax[:, None]] = 0.0
+    ww = kk[:, 0].copy()
+    for i in range(1, ksize):
+        ww += kk[:, i]
+    kk /= np.where(ww == 0.0, 1.0, ww)[:, None]
+    if not fixed:
+        return xmin, xmax, kk
+    one = 1 << PRECISION_BITS
+    fixed = np.where(kk < 0, np.trunc(-0.5 + kk * one), np.trunc(0.5 + kk * one)).astype(np.int32)
+    return xmin, xmax, fixed
+
+
+def upsample(lattices, w, h, box=None):
+    """Image.fromarray(lattice).resize((w, h), BICUBIC, box=box) for each lattice
+    of an (N, gh, gw) stack, as an (N, h, w) stack (possibly a strided view).
+
+    uint8 lattices are packed four to an RGBX image, so up to four fields
+    share one resize pass; Pillow filters the bands independently, so each
+    matches its own "L" resize exactly. Pillow has no multi-band float mode,
+    so float32 lattices get one "F" resize each.
+    """
+    n, gh, gw = lattices.shape
+    if lattices.dtype != np.uint8 or n == 1:
+        out = np.empty((n, h, w), dtype=lattices.dtype)
+        for i, lattice in enumerate(lattices):
+            img = Image.fromarray(np.ascontiguousarray(lattice))
+            out[i] = np.asarray(img.resize((w, h), resample=Image.BICUBIC, box=box))
+        return out
+    parts = []
+    for i in range(0, n, 4):
+        chunk = lattices[i:i + 4]
+        packed = np.zeros((gh, gw, 4), dtype=np.uint8)
+        packed[..., :len(chunk)] = np.moveaxis(chunk, 0, -1)
+        img = Image.frombytes("RGBX", (gw, gh), packed.tobytes())
+        img = np.asarray(img.resize((w, h), resample=Image.BICUBIC, box=box))
+        parts.append(np.moveaxis(img[..., :len(chunk)], -1, 0))
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def resample_rows(lattices, h, w, rows, box=None):
+    """Rows `rows` of upsample(lattices, w, h, box) for an (N, gh, gw) stack, in
+    the lattices' dtype (uint8, or float32 via Pillow's "F" mode)."""
+    _, gh, gw = lattices.shape
+    x0, y0, x1, y1 = box or (0, 0, gw, gh)
+
+    def horizontal(src):
+        if (x0, x1) == (0, gw) and gw == w: return src
+        return upsample(src, w, src.shape[1], box=(x0, 0, x1, src.shape[1]))
+    if (y0, y1) == (0, gh) and gh == h:
+        return horizontal(lattices[:, rows])
+    floating = lattices.dtype == np.float32
+    ymin, ylen, kk = bicubic_coeffs(gh, h, y0, y1, fixed=not floating)
+    ymin, ylen, kk = ymin[rows], ylen[rows], kk[rows]
+    first, last = ymin.min(), (ymin + ylen).max()
+    band = horizontal(lattices[:, first:last])
+    shape = (len(lattices), len(rows), w)
+    if floating:
+        # Double accumulator, tap by tap, as ImagingResampleVertical_32bpc.
+        acc = np.zeros(shape)
+        for i in range(kk.shape[1]):
+            take = np.minimum(ymin - first + i, last - first - 1)
+            acc += band[:, take] * kk[:, i, None]
+        return acc.astype(np.float32)
+    # int32 accumulator, exactly as Pillow's ImagingResampleVertical_8bpc.
+    acc = np.full(shape, 1 << (PRECISION_BITS - 1), dtype=np.int32)
+    for i in range(kk.shape[1]):
+        take = np.minimum(ymin - first + i, last - first - 1)
+        acc += band[:, take] * kk[:, i, None]
+    acc >>= PRECISION_BITS
+    return np.clip(acc, 0, 255, out=acc).astype(np.uint8)
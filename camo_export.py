@@ -0,0 +1,192 @@
+"""Export pipeline: compact indexed rasters and traced vectors at an explicit size.
+
+Exports render straight from the parameters, never from what is on screen,
+at a chosen pixel or print size, and write one of:
+
+    .png  palette PNG, 2 bits per pixel, zlib level 0-9
+    .tif  palette TIFF, 2 bits per pixel, uncompressed or Deflate
+    .svg  the layer regions traced into polygons, one filled path per colour
+
+    from camo_export import export, export_resolution
+    res = export_resolution(params, print_width=24, dpi=300)    # 24 inches at 300 dpi
+    export(params, "kryptek.tif", resolution=res, dpi=300)
+
+A pattern only ever has four colours, so 2 bits per pixel hold it exactly.
+Raster exports can stream in bands (camo_tiled), so memory stays bounded at
+any print size, and match render_array() at the same resolution pixel for pixel.
+SVG polygons follow the pixel edges exactly; digital patterns trace to very
+few vertices, analog ones are best traced at a modest resolution and scaled
+by the viewer or cutter.
+"""
+import json
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from camo_engine import (NO_STAGE, ROLES, new_stats, output_size, palette_array, publish, render_labels,
+                         repeat_metadata)
+from camo_tiled import band_height, iter_bands, open_writer
+
+EXPORT_FORMATS = ("png", "tif", "tiff", "svg")
+TIFF_COMPRESSION = ("none", "deflate")
+
+
+def export_resolution(params, width=None, height=None, print_width=None, print_height=None, dpi=300):
+    """Resolution factor (as taken by render_array) that exports params at an
+    explicit size: a pixel width or height, or a print width or height in
+    inches at `dpi`. The aspect ratio is always the params'."""
+    if print_width:
+        width = print_width * dpi
+    if print_height:
+        height = print_height * dpi
+    if width:
+        return width / params.width
+    if height:
+        return height / params.height
+    return 1.0
+
+
+def export(params, path, resolution=1.0, dpi=None, compress_level=6, tiff_compression="deflate",
+           max_memory_mb=None, metadata=False, progress=None):
+    """Render params at `resolution` into `path` (.png, .tif or .svg).
+
+    `dpi` is recorded in the file (pHYs, TIFF resolution, SVG physical size).
+    `compress_level` is the zlib level for PNG and Deflate TIFF. With
+    metadata=True the file carries repeat_metadata(params). Raster output is
+    rendered in one piece, reusing the render caches, unless `max_memory_mb`
+    is given, in which case it is streamed in bands that fit that budget.
+    `progress(rows_done, height)` is called per band for raster output.
+    """
+    ext = path.lower().rsplit(".", 1)[-1]
+    if ext not in EXPORT_FORMATS:
+        raise ValueError(f"export format must be one of {EXPORT_FORMATS}, got {path!r}")
+    if tiff_compression not in TIFF_COMPRESSION:
+        raise ValueError(f"tiff_compression must be one of {TIFF_COMPRESSION}, got {tiff_compression!r}")
+    stats = new_stats(params, resolution)
+    meta = repeat_metadata(params) if metadata else None
+    if ext == "svg":
+        labels = render_labels(params, resolution, stats=stats)
+        with stats.stage("trace") if stats else NO_STAGE:
+            svg = labels_svg(labels, params.colors, dpi, meta)
+        with stats.stage("encode") if stats else NO_STAGE:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(svg)
+    else:
+        w, h = output_size(params, resolution)
+        band_rows = band_height(w, max_memory_mb) if max_memory_mb else h
+        writer = open_writer(path, w, h, band_rows, compress_level, meta,
+                             palette=palette_array(params.colors), dpi=dpi,
+                             tiff_compression=tiff_compression)
+        try:
+            for y0, band in iter_bands(params, band_rows=band_rows, stats=stats,
+                                       resolution=resolution, labels=True):
+                with stats.stage("encode") if stats else NO_STAGE:
+                    writer.write(band)
+                if progress: progress(y0 + band.shape[0], h)
+        finally:
+            writer.close()
+    if stats is not None:
+        publish(stats.finish())
+
+
+def trace_rings(mask):
+    """Boundary rings of the 4-connected regions of a boolean mask, holes
+    included, as (n, 2) int arrays of (x, y) corners on the pixel grid.
+
+    Edges run with the region on the same side, outlines one way round and
+    holes the other, so an even-odd (or nonzero) fill of all the rings
+    reproduces the mask exactly. Consecutive corners alternate between
+    horizontal and vertical steps.
+    """
+    h, w = mask.shape
+    m = np.pad(np.asarray(mask, dtype=bool), 1)
+    above, below = m[:-1, 1:-1], m[1:, 1:-1]
+    left, right = m[1:-1, :-1], m[1:-1, 1:]
+    # Maximal straight runs of boundary, as (start x, start y, end x, end y).
+    segments = []
+    y, x0, x1 = _runs(above & ~below)          # region above: run rightwards
+    segments.append((x0, y, x1, y))
+    y, x0, x1 = _runs(below & ~above)          # region below: leftwards
+    segments.append((x1, y, x0, y))
+    x, y0, y1 = _runs((right & ~left).T)       # region right: downwards
+    segments.append((x, y0, x, y1))
+    x, y0, y1 = _runs((left & ~right).T)       # region left: upwards
+    segments.append((x, y1, x, y0))
+    sx, sy, ex, ey = (np.concatenate(c).astype(np.int64) for c in zip(*segments))
+    n = len(sx)
+    if n == 0:
+        return []
+
+    # Each segment continues with the one starting where it ends. Where two
+    # start at the same corner (diagonal pixels), take the left turn, which
+    # keeps diagonal neighbours apart.
+    start_key, end_key = sy * (w + 1) + sx, ey * (w + 1) + ex
+    order = np.argsort(start_key, kind="stable")
+    keys = start_key[order]
+    pos = np.searchsorted(keys, end_key)
+    nxt = order[pos]
+    alt = np.minimum(pos + 1, n - 1)
+    saddle = (pos + 1 < n) & (keys[alt] == end_key)
+    dx, dy = np.sign(ex - sx), np.sign(ey - sy)
+    cross = dx * dy[nxt] - dy * dx[nxt]
+    nxt = np.where(saddle & (cross > 0), order[alt], nxt).tolist()
+
+    rings = []
+    seen = [False] * n
+    sx, sy = sx.tolist(), sy.tolist()
+    for i in range(n):
+        if seen[i]:
+            continue
+        ring = []
+        while not seen[i]:
+            seen[i] = True
+            ring.append((sx[i], sy[i]))
+            i = nxt[i]
+        rings.append(np.array(ring, dtype=np.int64))
+    return rings
+
+
+def _runs(edges):
+    """(line, start, end) of every run of True along the rows of a 2-D array."""
+    padded = np.zeros((edges.shape[0], edges.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = edges
+    d = np.diff(padded, axis=1)
+    line, start = np.nonzero(d == 1)
+    _, end = np.nonzero(d == -1)
+    return line, start, end
+
+
+def rings_path(rings):
+    """SVG path data for rings from trace_rings, using H/V steps."""
+    parts = []
+    for ring in rings:
+        xs, ys = ring[:, 0].tolist(), ring[:, 1].tolist()
+        parts.append(f"M{xs[0]} {ys[0]}")
+        parts.extend(f"H{xs[k]}" if ys[k] == ys[k - 1] else f"V{ys[k]}" for k in range(1, len(xs)))
+        parts.append("Z")
+    return "".join(parts)
+
+
+def labels_svg(labels, colors, dpi=None, metadata=None):
+    """SVG document for a role label map: a base-colour rectangle and one
+    even-odd filled path per layer role present."""
+    h, w = labels.shape
+    size = f'width="{w}" height="{h}"'
+    if dpi:
+        size = f'width="{w / dpi:.6g}in" height="{h / dpi:.6g}in"'
+    out = ['<?xml version="1.0" encoding="UTF-8"?>',
+           f'<svg xmlns="http://www.w3.org/2000/svg" {size} viewBox="0 0 {w} {h}" '
+           'shape-rendering="crispEdges">']
+    if metadata:
+        out.append(f"<metadata>{escape(json.dumps(metadata, sort_keys=True))}</metadata>")
+    out.append(f'<rect id="base" width="{w}" height="{h}" fill="{colors["base"]}"/>')
+    for index, role in enumerate(ROLES):
+        if index == 0:
+            continue
+        mask = labels == index
+        if mask.any():
+            out.append(f'<path id="{role}" fill="{colors[role]}" fill-rule="evenodd" '
+                       f'd="{rings_path(trace_rings(mask))}"/>')
+    out.append("</svg>")
+    return "\n".join(out) + "\n"
+
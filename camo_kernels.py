@@ -0,0 +1,91 @@
+"""Optional compiled kernels for the Kryptek and Tiger hot loops.
+
+With Numba installed, each engine's per-pixel pipeline runs as one fused,
+parallel pass instead of a chain of full-size NumPy temporaries:
+
+    kryptek_web   warped coordinates -> three triangle waves -> web mask
+    tiger_waves   micro noise + flow warp -> both pinched sine waves
+
+The kernels repeat the NumPy path's operations in the same order and in the
+field dtype, so both paths give the same output (Tiger's only runs on float64
+fields, where Numba's sin and NumPy's agree); camo_engine picks them
+automatically when AVAILABLE (see camo_engine.set_kernels).
+tests/test_kernels.py checks the two paths against each other.
+"""
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # optional: camo_engine falls back to NumPy
+    numba = None
+
+AVAILABLE = numba is not None
+
+if AVAILABLE:
+    @numba.njit(inline="always")
+    def _tri(t, pi, two, one):
+        t = t / pi
+        t = t % two
+        t = t - one
+        t = abs(t)
+        t = t * two
+        return t - one
+
+    @numba.njit(parallel=True, cache=True)
+    def _kryptek_web(x, y, warp, fade, k):
+        dist, freq_x, freq_y, cell_thresh, fade_cutoff = k[0], k[1], k[2], k[3], k[4]
+        pi, two, one, minus_half, sin60, three, six = k[5], k[6], k[7], k[8], k[9], k[10], k[11]
+        n, w = warp.shape
+        web = np.empty((n, w), dtype=np.bool_)
+        for i in numba.prange(n):
+            for j in range(w):
+                warped = warp[i, j] * dist
+                x_freq = (x[j] + warped) * freq_x
+                y_freq = ((warped + y[i]) * freq_y) * sin60
+                x_half = x_freq * minus_half
+                raw_hex = _tri(x_freq, pi, two, one) + _tri(x_half + y_freq, pi, two, one)
+                raw_hex = raw_hex + _tri(x_half - y_freq, pi, two, one)
+                raw_hex = (raw_hex + three) / six
+                web[i, j] = not (raw_hex > cell_thresh) and fade[i, j] > fade_cutoff
+        return web
+
+    @numba.njit(parallel=True, cache=True)
+    def _tiger_waves(white, y, flow, pinch1, pinch2, k):
+        jagged, dist, freq1, freq2, half, pinch_gain, one = k[0], k[1], k[2], k[3], k[4], k[5], k[6]
+        n, w = flow.shape
+        wave1 = np.empty((n, w), dtype=flow.dtype)
+        wave2 = np.empty((n, w), dtype=flow.dtype)
+        for i in numba.prange(n):
+            for j in range(w):
+                distorted_y = white[i, j] * jagged + y[i]
+                distorted_y = distorted_y + flow[i, j] * dist
+                wave1[i, j] = np.sin(distorted_y * freq1) * ((pinch1[i, j] - half) * pinch_gain + one)
+                wave2[i, j] = np.sin(distorted_y * freq2 + one) * ((pinch2[i, j] - half) * pinch_gain + one)
+        return wave1, wave2
+
+
+def kryptek_web(x, y, warp, fade, dist, freq_x, freq_y, cell_thresh, fade_cutoff):
+    """Kryptek web mask (True on the web lines) for warp/fade rows sampled at
+    full-size coordinates x (columns) and y (rows)."""
+    k = np.array([dist, freq_x, freq_y, cell_thresh, fade_cutoff,
+                  np.pi, 2.0, 1.0, -0.5, 0.866, 3.0, 6.0], dtype=warp.dtype)
+    return _kryptek_web(x, y, warp, fade, k)
+
+
+def tiger_waves(white, y, flow, pinch1, pinch2, jagged, dist, freq1, freq2):
+    """Tiger's two pinched sine waves from the white noise, row coordinates y
+    and the flow/pinch fields."""
+    k = np.array([jagged, dist, freq1, freq2, 0.5, 1.2, 1.0], dtype=flow.dtype)
+    return _tiger_waves(white, y, flow, pinch1, pinch2, k)
+
+
+def prefer_omp_layer():
+    """Make Numba prefer its OpenMP threading layer, unless one was picked
+    with NUMBA_THREADING_LAYER. For programs that render from worker threads:
+    the TBB layer then hangs at interpreter exit, and workqueue is not safe
+    for concurrent launches. Call before the first render."""
+    if AVAILABLE and "NUMBA_THREADING_LAYER" not in os.environ:
+        numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+
@@ -0,0 +1,396 @@
+"""Local HTTP render service with a content-addressed disk cache.
+
+Serves pattern PNGs on demand, for storefront previews and the like:
+
+    python camo_server.py --port 8765 --cache-dir .camo_cache --cache-size 512
+    curl -o k.png "http://127.0.0.1:8765/render?preset=Kryptek+Inspired&seed=3&size=800x600"
+    curl -X POST -d '{"preset": "Lizard Inspired", "tileable": true, "scale": 80}' \\
+         -o l.png http://127.0.0.1:8765/render
+    curl http://127.0.0.1:8765/metrics
+
+A request names a preset plus any overrides RenderParams.from_dict accepts
+("seed" and "size=WxH" are accepted as shorthands for seed_offset and
+width/height). Query string and JSON body work the same way.
+
+The normalised parameters are hashed into the cache key, so equivalent
+requests share one cached file. The key is also the response's ETag, so a
+matching If-None-Match gets a 304 without any rendering. Cached PNGs
+(camo_export's 2-bit palette PNG) live in one directory, and the least
+recently used are deleted once the directory grows past --cache-size.
+Concurrent requests for the same key are coalesced into one render.
+GET /metrics reports request latency per outcome (hit, miss, coalesced,
+not_modified, bad_request, error) along with cache and render counters.
+
+Everything runs in-process on the standard library; RenderService is usable
+without the HTTP layer.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import camo_kernels
+from camo_engine import PRECISIONS, PRESETS, RenderParams
+from camo_export import export
+
+LOG = logging.getLogger("camo_server")
+
+# Bump when a change to the engines alters rendered pixels, or cache_key
+# changes what it hashes, so old cache entries (and clients' ETags) stop
+# matching.
+CACHE_VERSION = 2
+
+HEX_COLOR = re.compile(r"#[0-9A-Fa-f]{6}")
+
+
+def parse_request(query):
+    """RenderParams from a request's query or JSON body dict."""
+    d = dict(query)
+    if "seed" in d:
+        d["seed_offset"] = d.pop("seed")
+    if "size" in d:
+        try:
+            d["width"], d["height"] = (int(v) for v in str(d.pop("size")).lower().split("x"))
+        except ValueError:
+            raise ValueError("size must look like 800x600")
+    try:
+        params = RenderParams.from_dict(d)
+    except OverflowError:  # int(float("inf"))
+        raise ValueError("numeric settings must be finite")
+    for name in ("scale", "distortion", "feat_a", "feat_b", "morph"):
+        if not math.isfinite(getattr(params, name)):
+            raise ValueError(f"{name} must be a finite number")
+    if params.precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {params.precision!r}")
+    if params.width < 1 or params.height < 1:
+        raise ValueError("width and height must be positive")
+    if params.block_size < 1 or params.macro_block_size < 0:
+        raise ValueError("block_size must be at least 1 and macro_block_size at least 0")
+    for role, color in params.colors.items():
+        if not isinstance(color, str) or not HEX_COLOR.fullmatch(color):
+            raise ValueError(f"{role} colour must look like #RRGGBB, got {color!r}")
+    return params
+
+
+def cache_key(params):
+    """Hash of the parameters in canonical form: the cache key and ETag.
+
+    Settings a render ignores (block sizes of an analog render, the morph
+    seed when there is no morph) are dropped, and colours are compared
+    case-insensitively. Every colour is kept, hidden layer or not: a layer
+    toggle does not always hide its own colour (Chocolate Chip paints its
+    chips in the layer3 colour under the layer2 toggle).
+    """
+    d = params.to_dict()
+    d["colors"] = {role: c.upper() for role, c in d["colors"].items()}
+    if not d["digital"]:
+        d.pop("block_size")
+        d.pop("macro_block_size")
+    if not d["morph"]:
+        d.pop("morph_seed")
+    d["cache_version"] = CACHE_VERSION
+    blob = json.dumps(d, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+
+class DiskCache:
+    """Directory of rendered files, bounded by total bytes, evicting the least
+    recently used. Entries found on disk at start-up are adopted, oldest first."""
+    def __init__(self, root, max_bytes, suffix=".png"):
+        self.root, self.max_bytes, self.suffix = root, max_bytes, suffix
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.sizes = OrderedDict()
+        self.total = 0
+        self.hits = self.misses = self.evictions = 0
+        found = []
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.endswith(".tmp" + suffix):
+                os.remove(path)  # left over from an interrupted write
+            elif name.endswith(suffix):
+                st = os.stat(path)
+                found.append((st.st_mtime, name[:-len(suffix)], st.st_size))
+        for _, key, size in sorted(found):
+            self.sizes[key] = size
+            self.total += size
+        with self.lock:
+            self._evict()
+
+    def path(self, key):
+        return os.path.join(self.root, key + self.suffix)
+
+    def get(self, key, count=True):
+        """The cached bytes for key, or None. count=False leaves hits/misses alone."""
+        with self.lock:
+            if key not in self.sizes:
+                self.misses += count
+                return None
+            self.sizes.move_to_end(key)
+            self.hits += count
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+            os.utime(self.path(key))  # keeps the LRU order across restarts
+            return data
+        except FileNotFoundError:  # evicted meanwhile
+            return None
+
+    def put(self, key, write):
+        """Store the file `write(path)` produces under key; returns its bytes."""
+        fd, tmp = tempfile.mkstemp(suffix=".tmp" + self.suffix, dir=self.root)
+        os.close(fd)
+        try:
+            write(tmp)
+            with open(tmp, "rb") as f:
+                data = f.read()
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        with self.lock:
+            self.total += len(data) - self.sizes.pop(key, 0)
+            self.sizes[key] = len(data)
+            self._evict()
+        return data
+
+    def _evict(self):
+        # Always keep the newest entry, even when it alone exceeds the budget.
+        while self.total > self.max_bytes and len(self.sizes) > 1:
+            key, size = self.sizes.popitem(last=False)
+            self.total -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.sizes), "bytes": self.total, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class LatencyMetrics:
+    """Per-outcome request counts and latency percentiles over the last
+    `window` requests of each outcome."""
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.window = window
+        self.counts = {}
+        self.samples = {}
+
+    def record(self, outcome, seconds):
+        with self.lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            self.samples.setdefault(outcome, deque(maxlen=self.window)).append(seconds)
+
+    def to_dict(self):
+        with self.lock:
+            out = {}
+            for outcome, samples in self.samples.items():
+                ms = sorted(s * 1000 for s in samples)
+                out[outcome] = {"count": self.counts[outcome],
+                                "mean_ms": round(sum(ms) / len(ms), 2),
+                                "p50_ms": round(ms[len(ms) // 2], 2),
+                                "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 2),
+                                "max_ms": round(ms[-1], 2)}
+            return out
+
+
+class RenderService:
+    """Cached, coalesced rendering of params to PNG bytes, with metrics.
+
+    At most `workers` renders run at once; `max_pixels` caps the output size
+    a request may ask for.
+    """
+    def __init__(self, cache_dir, cache_bytes=512 * 1024 * 1024, workers=2, max_pixels=4096 * 4096,
+                 compress_level=6):
+        self.cache = DiskCache(cache_dir, cache_bytes)
+        self.metrics = LatencyMetrics()
+        self.max_pixels = max_pixels
+        self.compress_level = compress_level
+        self.slots = threading.BoundedSemaphore(workers)
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.renders = self.coalesced = 0
+        self.render_seconds = 0.0
+
+    def check(self, params):
+        if params.width * params.height > self.max_pixels:
+            raise ValueError(f"{params.width}x{params.height} is larger than the "
+                             f"{self.max_pixels}-pixel limit")
+
+    def get(self, params, key=None):
+        """(png bytes, outcome) for params; outcome is "hit", "miss" or "coalesced"."""
+        self.check(params)
+        key = key or cache_key(params)
+        data = self.cache.get(key)
+        if data is not None:
+            return data, "hit"
+        with self.lock:
+            fut = self.inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self.inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result(), "coalesced"
+        try:
+            # A leader that finished just before we registered has cached it.
+            data = self.cache.get(key, count=False)
+            outcome = "hit"
+            if data is None:
+                data, outcome = self._render(key, params), "miss"
+            fut.set_result(data)
+            return data, outcome
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+
+    def _render(self, key, params):
+        with self.slots:
+            t0 = time.perf_counter()
+            data = self.cache.put(key, lambda path: export(params, path, compress_level=self.compress_level))
+            seconds = time.perf_counter() - t0
+        with self.lock:
+            self.renders += 1
+            self.render_seconds += seconds
+        return data
+
+    def stats(self):
+        with self.lock:
+            renders = {"renders": self.renders, "coalesced": self.coalesced, "inflight": len(self.inflight),
+                       "render_seconds": round(self.render_seconds, 3)}
+        return {"requests": self.metrics.to_dict(), "cache": self.cache.stats(), "render": renders}
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """GET/POST /render, GET /presets and GET /metrics for server.service."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/render":
+            self.render(dict(parse_qsl(url.query)))
+        elif url.path == "/metrics":
+            self.send_json(200, self.server.service.stats())
+        elif url.path == "/presets":
+            self.send_json(200, list(PRESETS))
+        else:
+            self.send_json(404, {"error": f"no such endpoint: {url.path}"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/render":
+            return self.send_json(404, {"error": f"no such endpoint: {self.path}"})
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            query = json.loads(body or b"{}")
+            if not isinstance(query, dict):
+                raise ValueError("body must be a JSON object")
+        except ValueError as e:
+            return self.send_json(400, {"error": f"bad JSON body: {e}"})
+        self.render(query)
+
+    def render(self, query):
+        service = self.server.service
+        t0 = time.perf_counter()
+        outcome = "error"
+        try:
+            try:
+                params = parse_request(query)
+                service.check(params)
+            except (ValueError, TypeError) as e:
+                outcome = "bad_request"
+                return self.send_json(400, {"error": str(e)})
+            key = cache_key(params)
+            etag = f'"{key}"'
+            if etag in (t.strip() for t in self.headers.get("If-None-Match", "").split(",")):
+                outcome = "not_modified"
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            try:
+                data, outcome = service.get(params, key)
+            except Exception as e:
+                LOG.exception("render failed: %s", params)
+                return self.send_json(500, {"error": f"render failed: {e}"})
+            elapsed = time.perf_counter() - t0
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "public, max-age=86400")
+            self.send_header("X-Cache", outcome)
+            self.send_header("Server-Timing", f"{outcome};dur={elapsed * 1000:.1f}")
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            service.metrics.record(outcome, time.perf_counter() - t0)
+
+    def send_json(self, status, obj):
+        data = json.dumps(obj, indent=1).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        LOG.info("%s %s", self.address_string(), fmt % args)
+
+
+def make_server(service, host="127.0.0.1", port=8765):
+    """A ThreadingHTTPServer serving `service`; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), RenderHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve camo pattern PNGs over HTTP with a disk cache.")
+    ap.add_argument("--host", default="127.0.0.1", help="address to bind (default 127.0.0.1)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--cache-dir", default=".camo_cache", help="directory of cached renders")
+    ap.add_argument("--cache-size", type=int, default=512, metavar="MB",
+                    help="evict least recently used renders beyond this size (default 512)")
+    ap.add_argument("--workers", type=int, default=2, help="renders running at once (default 2)")
+    ap.add_argument("--max-pixels", type=int, default=4096 * 4096,
+                    help="largest width x height a request may ask for")
+    ap.add_argument("-q", "--quiet", action="store_true", help="do not log requests")
+    args = ap.parse_args(argv)
+    camo_kernels.prefer_omp_layer()  # renders run on the service's worker threads
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO,
+                        format="%(asctime)s %(message)s")
+    service = RenderService(args.cache_dir, args.cache_size * 1024 * 1024, args.workers, args.max_pixels)
+    server = make_server(service, args.host, args.port)
+    LOG.warning("serving on http://%s:%d/render", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
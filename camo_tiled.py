@@ -0,0 +1,267 @@
+"""Banded rendering for outputs too large to hold in memory.
+
+The image is produced a band of rows at a time and each band goes straight to
+a streaming PNG/TIFF writer or a memory-mapped .npy file, so working memory is
+bounded by the band size rather than the output size. Noise is sampled from
+the same low-res lattices as a full render (see camo_engine.resample_rows), so
+a banded render is pixel-identical to render_array() and has no seams.
+
+    from camo_tiled import render_to_file
+    render_to_file(RenderParams.from_preset("M81 Woodland Inspired", width=30000, height=30000),
+                   "woodland.tif", max_memory_mb=512)
+"""
+import json
+import struct
+import zlib
+
+import numpy as np
+
+from camo_engine import (NO_STAGE, expand_index, make_engine, new_stats, output_size, publish,
+                         repeat_metadata)
+
+# Rough peak working set of the heaviest engine (Brush Stroke), per output pixel.
+BYTES_PER_PIXEL = 128
+
+
+def band_height(width, max_memory_mb):
+    return max(16, int(max_memory_mb * 1024 * 1024) // (width * BYTES_PER_PIXEL))
+
+
+def iter_bands(params, max_memory_mb=256, band_rows=None, stats=None, resolution=1.0, labels=False):
+    """Yield (y0, band) for consecutive bands of rows covering the whole image:
+    RGB rows, or role labels (0 = base, 1-3 = layers) with labels=True.
+    `resolution` scales the output size, as for render_array."""
+    w, h = output_size(params, resolution)
+    band_rows = band_rows or band_height(w, max_memory_mb)
+    engine = make_engine(params, resolution=resolution, stats=stats)
+    generate = engine.generate_labels if labels else engine.generate_pattern
+    if params.digital:
+        # Render each band's blocks once, then expand them to pixels.
+        fx, fy = expand_index(w, engine.out_w), expand_index(h, engine.out_h)
+    for y0 in range(0, h, band_rows):
+        y1 = min(h, y0 + band_rows)
+        if params.digital:
+            rows, inverse = np.unique(fy[y0:y1], return_inverse=True)
+            band = generate(rows)
+            with engine.stage("digital"):
+                band = band[inverse][:, fx]
+        else:
+            band = generate(np.arange(y0, y1))
+        yield y0, band
+
+
+def pack_2bit(labels):
+    """Pack a band of 0-3 labels four pixels to a byte, first pixel in the high
+    bits and each row padded to whole bytes (PNG and TIFF 2-bit layout)."""
+    h, w = labels.shape
+    padded = np.zeros((h, -(-w // 4) * 4), dtype=np.uint8)
+    padded[:, :w] = labels
+    q = padded.reshape(h, -1, 4)
+    return (q[..., 0] << 6) | (q[..., 1] << 4) | (q[..., 2] << 2) | q[..., 3]
+
+
+def filter_up(packed, prev):
+    """PNG scanlines for packed rows with the Up filter (type 2): each row minus
+    the row above, `prev` standing in above the first. Returns (h, 1 + w) bytes."""
+    rows = np.empty((packed.shape[0], packed.shape[1] + 1), dtype=np.uint8)
+    rows[:, 0] = 2
+    np.subtract(packed[1:], packed[:-1], out=rows[1:, 1:])
+    np.subtract(packed[0], prev, out=rows[0, 1:])
+    return rows
+
+
+class PNGStreamWriter:
+    """Writes a PNG row band by row band; `text` becomes tEXt chunks.
+
+    Bands are 8-bit RGB rows, or with `palette` (four RGB colours) role labels
+    stored as a 2-bit palette image. `dpi` is recorded in a pHYs chunk.
+    """
+    def __init__(self, path, width, height, compress_level=6, text=None, palette=None, dpi=None):
+        self.f = open(path, "wb")
+        self.indexed = palette is not None
+        # Label rows mostly repeat the row above: the Up filter turns them into
+        # zero runs, which run-length deflate packs smaller and far faster than
+        # the default strategy.
+        strategy = zlib.Z_RLE if self.indexed else zlib.Z_DEFAULT_STRATEGY
+        self.zip = zlib.compressobj(compress_level, zlib.DEFLATED, 15, 9, strategy)
+        self.prev = np.zeros(-(-width // 4), dtype=np.uint8) if self.indexed else None
+        self.f.write(b"\x89PNG\r\n\x1a\n")
+        depth, color_type = (2, 3) if self.indexed else (8, 2)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, depth, color_type, 0, 0, 0))
+        if self.indexed:
+            self._chunk(b"PLTE", np.asarray(palette, dtype=np.uint8).tobytes())
+        if dpi:
+            ppm = int(round(dpi / 0.0254))
+            self._chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1))
+        for key, val in (text or {}).items():
+            self._chunk(b"tEXt", key.encode("latin-1") + b"\x00" + val.encode("latin-1"))
+
+    def _chunk(self, tag, data):
+        self.f.write(struct.pack(">I", len(data)))
+        self.f.write(tag + data)
+        self.f.write(struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    def write(self, band):
+        if self.indexed:
+            data = pack_2bit(band)
+            rows = filter_up(data, self.prev)
+            self.prev = data[-1].copy()
+        else:
+            data = band.reshape(band.shape[0], -1)
+            rows = np.empty((data.shape[0], data.shape[1] + 1), dtype=np.uint8)
+            rows[:, 0] = 0  # filter type None
+            rows[:, 1:] = data
+        data = self.zip.compress(rows.tobytes())
+        if data: self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self.zip.flush())
+        self._chunk(b"IEND", b"")
+        self.f.close()
+
+
+class TIFFStreamWriter:
+    """Writes a baseline TIFF, one strip per band.
+
+    Strips are written as they arrive and the IFD goes at the end of the file,
+    so nothing but the strip offsets is kept in memory. `description` is stored
+    as the ImageDescription tag. Bands are 8-bit RGB rows, or with `palette`
+    (four RGB colours) role labels stored as a 2-bit palette image.
+    `compression` is "none" or "deflate" (zlib at `compress_level`), and `dpi`
+    is recorded as the X/Y resolution.
+    """
+    COMPRESSION = {"none": 1, "deflate": 8}
+
+    def __init__(self, path, width, height, rows_per_strip, description=None, palette=None,
+                 compression="none", compress_level=6, dpi=None):
+        if compression not in self.COMPRESSION:
+            raise ValueError(f"TIFF compression must be one of {sorted(self.COMPRESSION)}, got {compression!r}")
+        self.palette = None if palette is None else np.asarray(palette, dtype=np.uint8)
+        row_bytes = -(-width // 4) if self.palette is not None else width * 3
+        if row_bytes * height >= 1 << 32:
+            raise ValueError("classic TIFF is limited to 4 GB; write .npy or .png instead")
+        self.width, self.height, self.rows_per_strip = width, height, rows_per_strip
+        self.description = description
+        self.compression, self.compress_level, self.dpi = compression, compress_level, dpi
+        self.f = open(path, "wb")
+        self.f.write(b"II*\x00" + struct.pack("<I", 0))
+        self.offsets, self.counts = [], []
+
+    def write(self, band):
+        self.offsets.append(self.f.tell())
+        data = pack_2bit(band) if self.palette is not None else band
+        data = np.ascontiguousarray(data).tobytes()
+        if self.compression == "deflate":
+            data = zlib.compress(data, self.compress_level)
+        self.counts.append(len(data))
+        self.f.write(data)
+
+    def _extra(self, fmt, *values):
+        """Write tag values that do not fit in the IFD entry; returns their offset."""
+        f = self.f
+        if f.tell() % 2: f.write(b"\x00")
+        at = f.tell()
+        f.write(struct.pack(fmt, *values))
+        return at
+
+    def close(self):
+        f = self.f
+        indexed = self.palette is not None
+        if not indexed:
+            bps_at = self._extra("<3H", 8, 8, 8)
+        offsets_at = f.tell()
+        f.write(struct.pack(f"<{len(self.offsets)}I", *self.offsets))
+        counts_at = f.tell()
+        f.write(struct.pack(f"<{len(self.counts)}I", *self.counts))
+        n = len(self.offsets)
+        ASCII, SHORT, LONG, RATIONAL = 2, 3, 4, 5
+        tags = [
+            (256, LONG, 1, self.width),
+            (257, LONG, 1, self.height),
+            (258, SHORT, 1, 2) if indexed else (258, SHORT, 3, bps_at),
+            (259, SHORT, 1, self.COMPRESSION[self.compression]),
+            (262, SHORT, 1, 3 if indexed else 2),   # palette / RGB
+            (273, LONG, n, offsets_at if n > 1 else self.offsets[0]),
+            (277, SHORT, 1, 1 if indexed else 3),
+            (278, LONG, 1, self.rows_per_strip),
+            (279, LONG, n, counts_at if n > 1 else self.counts[0]),
+            (284, SHORT, 1, 1),                     # chunky
+        ]
+        if indexed:
+            # ColorMap: all reds, then greens, then blues, as 16-bit values.
+            cmap = np.zeros((3, 4), dtype=np.uint16)
+            cmap[:, :len(self.palette)] = self.palette.T.astype(np.uint16) * 257
+            tags.append((320, SHORT, 12, self._extra("<12H", *cmap.ravel().tolist())))
+        if self.dpi:
+            dpi = int(round(self.dpi))
+            tags.append((282, RATIONAL, 1, self._extra("<2I", dpi, 1)))
+            tags.append((283, RATIONAL, 1, self._extra("<2I", dpi, 1)))
+            tags.append((296, SHORT, 1, 2))         # inches
+        if self.description:
+            desc = self.description.encode("latin-1") + b"\x00"
+            tags.append((270, ASCII, len(desc), self._extra(f"<{len(desc)}s", desc)))
+        tags.sort()
+        if f.tell() % 2: f.write(b"\x00")
+        ifd_at = f.tell()
+        f.write(struct.pack("<H", len(tags)))
+        for tag, typ, count, value in tags:
+            if typ == SHORT and count == 1:
+                f.write(struct.pack("<HHIHH", tag, typ, count, value, 0))
+            else:
+                f.write(struct.pack("<HHII", tag, typ, count, value))
+        f.write(struct.pack("<I", 0))
+        f.seek(4)
+        f.write(struct.pack("<I", ifd_at))
+        f.close()
+
+
+class NPYMemmapWriter:
+    """Writes bands into a memory-mapped (h, w, 3) uint8 .npy file."""
+    def __init__(self, path, width, height):
+        self.out = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+        self.y = 0
+
+    def write(self, band):
+        self.out[self.y:self.y + band.shape[0]] = band
+        self.y += band.shape[0]
+
+    def close(self):
+        self.out.flush()
+        del self.out
+
+
+def open_writer(path, width, height, band_rows, compress_level=6, metadata=None, palette=None,
+                dpi=None, tiff_compression="none"):
+    """Streaming writer for `path` by extension. With `palette` the writer takes
+    label bands and stores a 2-bit palette PNG/TIFF."""
+    ext = path.lower().rsplit(".", 1)[-1]
+    if ext == "png":
+        return PNGStreamWriter(path, width, height, compress_level, metadata, palette, dpi)
+    if ext in ("tif", "tiff"):
+        return TIFFStreamWriter(path, width, height, band_rows, metadata and json.dumps(metadata),
+                                palette, tiff_compression, compress_level, dpi)
+    if palette is not None:
+        raise ValueError(f"indexed output must be .png or .tif, got {path!r}")
+    if ext == "npy":
+        return NPYMemmapWriter(path, width, height)
+    raise ValueError(f"banded output must be .png, .tif or .npy, got {path!r}")
+
+
+def render_to_file(params, path, max_memory_mb=256, band_rows=None, progress=None, metadata=False):
+    """Render params band by band into `path`; `progress(rows_done, height)` is called per band.
+
+    With metadata=True the PNG/TIFF carries repeat_metadata(params), as save_image() writes it.
+    """
+    band_rows = band_rows or band_height(params.width, max_memory_mb)
+    stats = new_stats(params)
+    writer = open_writer(path, params.width, params.height, band_rows,
+                         metadata=repeat_metadata(params) if metadata else None)
+    try:
+        for y0, band in iter_bands(params, band_rows=band_rows, stats=stats):
+            with stats.stage("encode") if stats else NO_STAGE:
+                writer.write(band)
+            if progress: progress(y0 + band.shape[0], params.height)
+    finally:
+        writer.close()
+    if stats is not None:
+        publish(stats.finish())
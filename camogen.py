@@ -1,8 +1,74 @@
 import tkinter as tk
-from tkinter import ttk, colorchooser, filedialog
+from tkinter import ttk, colorchooser, filedialog, simpledialog
 from PIL import Image, ImageTk
-import numpy as np
 import random
+import threading
+import traceback
+
+import camo_kernels
+from camo_engine import PRESETS, RenderParams, RenderCancelled, RenderStats, publish, render_image
+from camo_export import export, export_resolution
+
+class RenderScheduler:
+    """Runs renders on a worker thread so the Tk thread never blocks.
+
+    Only the newest request is kept: anything still queued is replaced, and a
+    render already running is cancelled at its next stage. Preview requests
+    render at `preview_resolution` and schedule a full-resolution render once
+    requests stop arriving for `idle_ms`. Finished frames are handed to
+    `deliver(img, stats)` on the Tk thread via root.after, with the
+    RenderStats of the render that produced them.
+    """
+    def __init__(self, root, deliver, preview_resolution=0.5, idle_ms=200):
+        self.root = root
+        self.deliver = deliver
+        self.preview_resolution = preview_resolution
+        self.idle_ms = idle_ms
+        self.generation = 0
+        self.pending = None
+        self.idle_job = None
+        self.cond = threading.Condition()
+        threading.Thread(target=self.worker, daemon=True).start()
+
+    def request(self, params, preview=False):
+        """Queue a render of `params`. Call from the Tk thread."""
+        if self.idle_job is not None:
+            self.root.after_cancel(self.idle_job)
+            self.idle_job = None
+        if preview:
+            self.idle_job = self.root.after(self.idle_ms, self.request, params)
+        resolution = self.preview_resolution if preview else 1.0
+        with self.cond:
+            self.generation += 1
+            self.pending = (self.generation, params, resolution)
+            self.cond.notify()
+
+    def worker(self):
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                gen, params, resolution = self.pending
+                self.pending = None
+            stats = RenderStats(params, resolution)
+            try:
+                # Digital renders come back as their block grid; show_image expands it.
+                img = render_image(params, resolution, should_cancel=lambda: gen != self.generation,
+                                   stats=stats, expand=False)
+            except RenderCancelled:
+                continue
+            except Exception:
+                traceback.print_exc()
+                continue
+            try:
+                self.root.after(0, self.hand_off, gen, img, stats)
+            except RuntimeError:
+                return  # Tk has shut down
+
+    def hand_off(self, gen, img, stats):
+        # A newer request may have been queued while this frame was in flight.
+        if gen == self.generation:
+            self.deliver(img, stats)
 
 class UniversalCamoGen:
     def __init__(self, root):
@@ -14,54 +80,7 @@ class UniversalCamoGen:
         self.height = 700
         
         # --- PRESETS ---
-        self.defaults = {
-            "Tiger Stripe Inspired": {
-                "colors": {"base": "#C3B091", "layer1": "#384A20", "layer2": "#6F4E37", "layer3": "#101010"},
-                "params": {"scale": 7.0, "distortion": 80.0, "feat_a": 15.0, "feat_b": 2.0, 
-                           "thresh1": 3, "thresh2": 5, "thresh3": 3}
-            },
-            "M81 Woodland Inspired": {
-                "colors": {"base": "#B0A182", "layer1": "#3F4533", "layer2": "#4A3224", "layer3": "#121212"},
-                "params": {"scale": 10.0, "distortion": 120.0, "feat_a": 7.0, "feat_b": 1.0, 
-                           "thresh1": 6, "thresh2": 4, "thresh3": 2}
-            },
-            "Flecktarn Inspired": {
-                "colors": {"base": "#586243", "layer1": "#6D5F44", "layer2": "#3B422E", "layer3": "#181A16"},
-                "params": {"scale": 15.0, "distortion": 66.0, "feat_a": 13.0, "feat_b": 25.0, 
-                           "thresh1": 5, "thresh2": 3, "thresh3": 1}
-            },
-            "Chocolate Chip Inspired": { 
-                "colors": {"base": "#FFFFFF", "layer1": "#8B4513", "layer2": "#000000", "layer3": "#D2B48C"},
-                "params": {"scale": 60.0, "distortion": 0.0, "feat_a": 1.0, "feat_b": 0.0, 
-                           "thresh1": 6, "thresh2": 5, "thresh3": 1}
-            },
-            "British DPM Inspired": { 
-                "colors": {"base": "#C8B682", "layer1": "#575E40", "layer2": "#6F482F", "layer3": "#151515"},
-                "params": {"scale": 25.0, "distortion": 22.0, "feat_a": 0.0, "feat_b": 1.1, 
-                           "thresh1": 4, "thresh2": 4, "thresh3": 1}
-            },
-            "British Brush Stroke Inspired": { 
-                "colors": {"base": "#E0D6AA", "layer1": "#788055", "layer2": "#8B4513", "layer3": "#402518"},
-                "params": {"scale": 25.0, "distortion": 40.0, "feat_a": 10.0, "feat_b": 25.0, 
-                           "thresh1": 6, "thresh2": 5, "thresh3": 4}
-            },
-            "Lizard Inspired": { 
-                "colors": {"base": "#E2D3A7", "layer1": "#4B5F3E", "layer2": "#8C583A", "layer3": "#3E4435"},
-                "params": {"scale": 20.0, "distortion": 30.0, "feat_a": 12.0, "feat_b": 35.0, 
-                           "thresh1": 6, "thresh2": 5, "thresh3": 2}
-            },
-            "Puzzle Inspired": { 
-                "colors": {"base": "#D8CBA0", "layer1": "#607045", "layer2": "#805040", "layer3": "#202020"},
-                "params": {"scale": 35.0, "distortion": 10.0, "feat_a": 1.0, "feat_b": 0.0, 
-                           "thresh1": 7, "thresh2": 6, "thresh3": 5}
-            },
-            "Kryptek Inspired": { 
-                "colors": {"base": "#2b2b2b", "layer1": "#4B5320", "layer2": "#707850", "layer3": "#050505"},
-                # Defaults: Scale 100, Distortion 200, Feat A 0, Feat B 50
-                "params": {"scale": 100.0, "distortion": 200.0, "feat_a": 6.0, "feat_b": 0.0, 
-                           "thresh1": 5, "thresh2": 5, "thresh3": 5}
-            }
-        }
+        self.defaults = PRESETS
         
         self.current_mode = tk.StringVar(value="Kryptek Inspired")
         self.colors = self.defaults["Kryptek Inspired"]["colors"].copy()
@@ -70,6 +89,7 @@ class UniversalCamoGen:
         self.val_labels = {}
         self.layer_vars = {} 
         self.digital_mode = tk.BooleanVar(value=False)
+        self.multi_scale = tk.BooleanVar(value=False)
 
         # --- UI LAYOUT ---
         self.control_frame = ttk.Frame(root, padding="20")
@@ -81,6 +101,10 @@ class UniversalCamoGen:
         self.canvas_label = ttk.Label(self.canvas_frame)
         self.canvas_label.pack(expand=True)
 
+        self.status = ttk.Label(self.canvas_frame, foreground="#555", anchor="w")
+        self.status.pack(side=tk.BOTTOM, fill=tk.X)
+
+        self.scheduler = RenderScheduler(root, self.show_image)
         self.setup_controls()
         
     def setup_controls(self):
@@ -99,6 +123,9 @@ class UniversalCamoGen:
 
         chk = ttk.Checkbutton(self.control_frame, text="Digital / Pixelated Mode", 
                               variable=self.digital_mode, command=self.update_req)
+        chk.pack(fill=tk.X)
+        chk = ttk.Checkbutton(self.control_frame, text="Multi-Scale Pixels (MARPAT)",
+                              variable=self.multi_scale, command=self.update_req)
         chk.pack(fill=tk.X, pady=(0, 15))
 
         # Sliders
@@ -179,7 +206,7 @@ class UniversalCamoGen:
                 self.val_labels[attr_name].config(text=f"{snapped}")
             else:
                 self.val_labels[attr_name].config(text=f"{val_float:.1f}")
-            self.update_req()
+            self.update_req(preview=True)
 
         scale = ttk.Scale(self.control_frame, from_=min_v, to=max_v, variable=var, command=on_slide)
         scale.pack(fill=tk.X, pady=(0, 5))
@@ -212,9 +239,9 @@ class UniversalCamoGen:
     def on_mode_change(self, event):
         self.reset_to_defaults()
 
-    def update_req(self):
+    def update_req(self, preview=False):
         if getattr(self, "suppress_updates", False): return
-        self.generate_pattern()
+        self.generate_pattern(preview)
         
     def new_seed(self):
         if not hasattr(self, 'seed_offset'): self.seed_offset = 0
@@ -244,217 +271,65 @@ class UniversalCamoGen:
             self.color_btns[key].config(bg=values[i])
         self.generate_pattern()
 
-    def get_noise(self, h, w, scale, stretch_x=1.0, stretch_y=1.0, seed_add=0):
-        seed_base = int(self.vars['scale'].get()) + seed_add + getattr(self, 'seed_offset', 0)
-        np.random.seed(seed_base)
-        safe_scale = max(1.0, scale)
-        gh = int(h / (safe_scale * stretch_y)) + 2 
-        gw = int(w / (safe_scale * stretch_x)) + 2
-        noise = np.random.rand(gh, gw)
-        img = Image.fromarray((noise * 255).astype(np.uint8))
-        img = img.resize((w, h), resample=Image.BICUBIC)
-        return np.array(img).astype(np.float64) / 255.0
-
-    def generate_pattern(self):
-        mode = self.current_mode.get()
-        w, h = self.width, self.height
-        
-        scale = self.vars['scale'].get()
-        dist = self.vars['distortion'].get()
-        feat_a = self.vars['feat_a'].get()
-        feat_b = self.vars['feat_b'].get()
-        
-        d1 = round(self.vars['thresh1'].get())
-        d2 = round(self.vars['thresh2'].get())
-        d3 = round(self.vars['thresh3'].get())
-        
-        def get_cutoff(density_int): return 1.0 - (density_int / 10.0)
-        t1 = get_cutoff(d1)
-        t2 = get_cutoff(d2)
-        t3 = get_cutoff(d3)
-
-        final = np.zeros((h, w, 3), dtype=np.uint8)
-        hex2rgb = lambda x: tuple(int(x[i:i+2], 16) for i in (1, 3, 5))
-        final[:,:] = hex2rgb(self.colors["base"])
-
-        if mode == "Kryptek Inspired":
-            self.algo_kryptek_v11(final, w, h, scale, dist, feat_a, feat_b, hex2rgb, t1, t2, t3)
-        elif mode == "Tiger Stripe Inspired":
-            self.algo_tiger(final, w, h, scale, dist, feat_a, feat_b, hex2rgb, t1, t2, t3)
-        elif mode in ["M81 Woodland Inspired", "Puzzle Inspired"]:
-            self.algo_woodland_family(final, w, h, scale, dist, feat_a, feat_b, hex2rgb, t1, t2, t3)
-        elif mode == "British DPM Inspired":
-            self.algo_dpm(final, w, h, scale, dist, feat_a, feat_b, hex2rgb, t1, t2, t3)
-        elif mode == "Flecktarn Inspired":
-            self.algo_flecktarn(final, w, h, scale, dist, feat_a, feat_b, hex2rgb, t1, t2, t3)
-        elif mode == "Chocolate Chip Inspired":
-            self.algo_chocolate(final, w, h, scale, dist, feat_a, feat_b, hex2rgb, t1, t2, t3)
-        elif mode == "British Brush Stroke Inspired":
-            self.algo_brush_v2(final, w, h, scale, dist, feat_a, feat_b, hex2rgb, t1, t2, t3)
-        elif "Lizard" in mode:
-            self.algo_lizard_v2(final, w, h, scale, dist, feat_a, feat_b, hex2rgb, t1, t2, t3)
-
-        img = Image.fromarray(final)
-        if self.digital_mode.get():
-            block_size = 8
-            small = img.resize((w // block_size, h // block_size), resample=Image.NEAREST)
-            img = small.resize((w, h), resample=Image.NEAREST)
-
-        self.tk_img = ImageTk.PhotoImage(img)
+    def current_params(self):
+        return RenderParams(
+            mode=self.current_mode.get(),
+            width=self.width, height=self.height,
+            scale=self.vars['scale'].get(),
+            distortion=self.vars['distortion'].get(),
+            feat_a=self.vars['feat_a'].get(),
+            feat_b=self.vars['feat_b'].get(),
+            thresh1=round(self.vars['thresh1'].get()),
+            thresh2=round(self.vars['thresh2'].get()),
+            thresh3=round(self.vars['thresh3'].get()),
+            colors=self.colors.copy(),
+            layers={role: var.get() for role, var in self.layer_vars.items()},
+            digital=self.digital_mode.get(),
+            macro_block_size=16 if self.multi_scale.get() else 0,
+            seed_offset=getattr(self, 'seed_offset', 0))
+
+    def generate_pattern(self, preview=False):
+        self.scheduler.request(self.current_params(), preview)
+
+    def show_image(self, img, stats=None):
+        stats = stats or RenderStats()
+        if img.size != (self.width, self.height):
+            with stats.stage("upscale"):
+                img = img.resize((self.width, self.height), resample=Image.NEAREST)
+        with stats.stage("photoimage"):
+            self.tk_img = ImageTk.PhotoImage(img)
         self.canvas_label.configure(image=self.tk_img)
-
-    # --- ALGORITHM: KRYPTEK V11 (TRIANGLE WAVE) ---
-    def algo_kryptek_v11(self, final, w, h, scale, dist, fade_amt, line_thick, hex2rgb, t1, t2, t3):
-        bg_noise = self.get_noise(h, w, scale * 3.0, seed_add=100)
-        x = np.linspace(0, w, w).reshape(1, w)
-        y = np.linspace(0, h, h).reshape(h, 1)
-        
-        warp = self.get_noise(h, w, scale * 4.0, seed_add=200) * dist
-        x_dist = x + warp
-        y_dist = y + warp
-        freq = scale / 500.0
-        
-        # TRIANGLE WAVE FUNCTION: Creates linear gradients (straight lines)
-        # Standard Cosine creates curved gradients (circles).
-        def tri(t):
-            # Maps periodic input to -1.0 ... 1.0 in a linear zig-zag
-            return np.abs((t / np.pi) % 2.0 - 1.0) * 2.0 - 1.0
-
-        # 3-Axis Triangle Wave Interference
-        v1 = tri(x_dist * freq)
-        v2 = tri(x_dist * freq * -0.5 + y_dist * freq * 0.866)
-        v3 = tri(x_dist * freq * -0.5 - y_dist * freq * 0.866)
-        
-        # Sum them up
-        # The interference of linear gradients creates polygonal shapes.
-        raw_hex = v1 + v2 + v3
-        
-        # Normalize (roughly -3 to +3 -> 0 to 1)
-        raw_hex = (raw_hex + 3.0) / 6.0
-
-        # CELL LOGIC (Peaks)
-        cell_thresh = 0.4 + (line_thick / 50.0) * 0.4
-        cell_mask = (raw_hex > cell_thresh)
-        web_mask = ~cell_mask
-        
-        fade_mask_noise = self.get_noise(h, w, scale * 4.0, seed_add=555)
-        fade_cutoff = fade_amt / 40.0
-        visible_mask = fade_mask_noise > fade_cutoff
-        final_grid = web_mask & visible_mask
-        
-        offset = 15 
-        shadow_grid = np.roll(final_grid, offset, axis=0)
-        shadow_grid = np.roll(shadow_grid, offset, axis=1)
-        
-        if self.layer_vars['layer1'].get():
-            final[bg_noise > 0.5] = hex2rgb(self.colors["layer1"])
-        if self.layer_vars['layer3'].get():
-            final[shadow_grid] = hex2rgb(self.colors["layer3"])
-        if self.layer_vars['layer2'].get():
-            final[final_grid] = hex2rgb(self.colors["layer2"])
-
-    def algo_lizard_v2(self, final, w, h, scale, dist, stretch, breakage, hex2rgb, t1, t2, t3):
-        base_stretch = max(1.0, stretch / 2.0)
-        blobs = self.get_noise(h, w, scale, stretch_x=base_stretch, seed_add=100)
-        scratch_scale = max(1.0, scale / 4.0)
-        scratch_stretch = max(5.0, stretch * 2.0)
-        scratches = self.get_noise(h, w, scratch_scale, stretch_x=scratch_stretch, seed_add=200)
-        warp = self.get_noise(h, w, scale * 2.0, seed_add=300) * (dist / 100.0)
-        lizard_map = (blobs * (0.3 + 0.7 * scratches)) + warp
-        if self.layer_vars['layer1'].get(): final[lizard_map > t1] = hex2rgb(self.colors["layer1"])
-        if self.layer_vars['layer2'].get(): final[lizard_map > (t2 + 0.1)] = hex2rgb(self.colors["layer2"])
-        if self.layer_vars['layer3'].get(): 
-            l3_map = lizard_map * scratches
-            final[l3_map > (t3 + 0.15)] = hex2rgb(self.colors["layer3"])
-
-    def algo_brush_v2(self, final, w, h, scale, dist, stretch, bristle_tex, hex2rgb, t1, t2, t3):
-        stroke_scale = scale * 2.0
-        stroke_stretch = max(4.0, stretch + 2.0)
-        strokes_1 = self.get_noise(h, w, stroke_scale, stretch_x=stroke_stretch, seed_add=10)
-        strokes_2 = self.get_noise(h, w, stroke_scale, stretch_x=stroke_stretch, seed_add=20)
-        strokes_3 = self.get_noise(h, w, stroke_scale, stretch_x=stroke_stretch, seed_add=30)
-        bristle_scale = max(1.0, scale / 5.0)
-        bristles = self.get_noise(h, w, bristle_scale, stretch_x=stroke_stretch*1.5, seed_add=99)
-        bristle_mix = bristle_tex / 50.0 
-        texture_mask = (1.0 - bristle_mix) + (bristles * bristle_mix)
-        warp = self.get_noise(h, w, scale * 3.0, seed_add=500) * (dist / 150.0)
-        s1_final = (strokes_1 * texture_mask) + warp
-        s2_final = (strokes_2 * texture_mask) + warp
-        s3_final = (strokes_3 * texture_mask) + warp
-        if self.layer_vars['layer1'].get(): final[s1_final > t1] = hex2rgb(self.colors["layer1"])
-        if self.layer_vars['layer2'].get(): final[s2_final > t2] = hex2rgb(self.colors["layer2"])
-        if self.layer_vars['layer3'].get(): final[s3_final > t3] = hex2rgb(self.colors["layer3"])
-
-    def algo_tiger(self, final, w, h, scale, dist, stretch, jagged, hex2rgb, t1, t2, t3):
-        y_grid = np.linspace(0, h, h).reshape(h, 1)
-        micro_noise = np.random.rand(h, w) * jagged
-        flow_map = self.get_noise(h, w, scale*2, stretch_x=stretch, seed_add=10)
-        distorted_y = y_grid + micro_noise + (flow_map * dist)
-        freq = scale / 250.0
-        if self.layer_vars['layer1'].get():
-            pinch1 = self.get_noise(h, w, scale, stretch_x=stretch/2, seed_add=20)
-            wave1 = np.sin(distorted_y * freq) * (1 + 1.2 * (pinch1 - 0.5))
-            final[wave1 > t1] = hex2rgb(self.colors["layer1"])
-        if self.layer_vars['layer2'].get() or self.layer_vars['layer3'].get():
-            pinch2 = self.get_noise(h, w, scale, stretch_x=stretch, seed_add=30)
-            wave2 = np.sin(distorted_y * (freq * 1.2) + 1.0) * (1 + 1.2 * (pinch2 - 0.5))
-            if self.layer_vars['layer2'].get(): final[wave2 > t2] = hex2rgb(self.colors["layer2"])
-            if self.layer_vars['layer3'].get(): final[wave2 > (t3 + 0.15)] = hex2rgb(self.colors["layer3"])
-
-    def algo_dpm(self, final, w, h, scale, dist, stretch, rough, hex2rgb, t1, t2, t3):
-        warp_x = self.get_noise(h, w, scale * 3, seed_add=50) * dist
-        stipple = self.get_noise(h, w, 3.0, seed_add=777) * (rough / 15.0)
-        base_scale = scale * 2.0
-        n1 = self.get_noise(h, w, base_scale, seed_add=100) + warp_x * 0.01 + stipple
-        n2 = self.get_noise(h, w, base_scale, seed_add=200) + warp_x * 0.01 + stipple
-        n3 = self.get_noise(h, w, base_scale, seed_add=300) + warp_x * 0.01 + stipple
-        if self.layer_vars['layer1'].get(): final[n1 > t1] = hex2rgb(self.colors["layer1"])
-        if self.layer_vars['layer2'].get(): final[n2 > t2] = hex2rgb(self.colors["layer2"])
-        if self.layer_vars['layer3'].get(): final[n3 > t3] = hex2rgb(self.colors["layer3"])
-
-    def algo_woodland_family(self, final, w, h, scale, dist, blob_size, roughness, hex2rgb, t1, t2, t3):
-        if self.current_mode.get() == "Puzzle Inspired": roughness = 0.5 
-        warp_x = self.get_noise(h, w, scale * 3, seed_add=50) * dist
-        base_scale = scale * (blob_size / 2.0)
-        n1 = self.get_noise(h, w, base_scale, seed_add=100)
-        n2 = self.get_noise(h, w, base_scale, seed_add=200)
-        n3 = self.get_noise(h, w, base_scale, seed_add=300)
-        turb = self.get_noise(h, w, scale/2, seed_add=400) * (roughness / 10.0)
-        n1 += turb; n2 += turb; n3 += turb
-        if self.layer_vars['layer1'].get(): final[n1 > t1] = hex2rgb(self.colors["layer1"])
-        if self.layer_vars['layer2'].get(): final[n2 > t2] = hex2rgb(self.colors["layer2"])
-        if self.layer_vars['layer3'].get(): final[n3 > t3] = hex2rgb(self.colors["layer3"])
-
-    def algo_chocolate(self, final, w, h, scale, dist, blob_size, chip_size, hex2rgb, t1, t2, t3):
-        self.algo_woodland_family(final, w, h, scale, dist, blob_size, 20.0, hex2rgb, t1, t2, t3)
-        if self.layer_vars['layer2'].get(): 
-            chip_scale = scale / 4.0
-            chips = self.get_noise(h, w, chip_scale, seed_add=999)
-            mask_shadow = chips > t3
-            mask_center = chips > (t3 + 0.05)
-            final[mask_shadow] = hex2rgb(self.colors["layer2"]) 
-            final[mask_center] = hex2rgb(self.colors["layer3"]) 
-
-    def algo_flecktarn(self, final, w, h, scale, dist, density, dot_size, hex2rgb, t1, t2, t3):
-        region_scale = scale * 2.5
-        reg1 = self.get_noise(h, w, region_scale, seed_add=500)
-        reg2 = self.get_noise(h, w, region_scale, seed_add=600)
-        reg3 = self.get_noise(h, w, region_scale, seed_add=700)
-        mix = self.get_noise(h, w, scale, seed_add=800) * (dist / 100.0)
-        reg1 += mix; reg2 += mix; reg3 += mix
-        dot_scale = max(2.0, dot_size) 
-        dots = self.get_noise(h, w, dot_scale, seed_add=900)
-        dot_thresh = 1.0 - (density / 18.0)
-        if self.layer_vars['layer1'].get(): final[(reg1 > t1) & (dots > dot_thresh)] = hex2rgb(self.colors["layer1"])
-        if self.layer_vars['layer2'].get(): final[(reg2 > t2) & (dots > dot_thresh)] = hex2rgb(self.colors["layer2"])
-        if self.layer_vars['layer3'].get(): final[(reg3 > t3) & (dots > dot_thresh)] = hex2rgb(self.colors["layer3"])
+        publish(stats.finish())
+        preview = " (preview)" if stats.resolution < 1 else ""
+        self.status.config(text=f"Render{preview}: {stats.summary()}")
 
     def save_image(self):
-        fp = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG", "*.png")])
-        if fp:
-            ImageTk.getimage(self.tk_img).save(fp)
+        # Exports re-render from the current parameters at the chosen size, so
+        # they never depend on the preview frame that happens to be on screen.
+        fp = filedialog.asksaveasfilename(
+            defaultextension=".png",
+            filetypes=[("PNG", "*.png"), ("TIFF", "*.tif"), ("SVG", "*.svg")])
+        if not fp:
+            return
+        width = simpledialog.askinteger("Export", "Width in pixels:", parent=self.root,
+                                        initialvalue=self.width, minvalue=16)
+        if not width:
+            return
+        params = self.current_params()
+        self.status.config(text=f"Exporting {fp}...")
+
+        def run():
+            try:
+                export(params, fp, resolution=export_resolution(params, width=width))
+                msg = f"Exported {fp}"
+            except Exception as e:
+                traceback.print_exc()
+                msg = f"Export failed: {e}"
+            self.root.after(0, lambda: self.status.config(text=msg))
+        threading.Thread(target=run, daemon=True).start()
 
 if __name__ == "__main__":
+    camo_kernels.prefer_omp_layer()  # renders run on RenderScheduler's worker thread
     root = tk.Tk()
     try:
         from ctypes import windll
@@ -0,0 +1,13 @@
+"""Cache budgets of animation sequences."""
+from camo_anim import render_sequence, sweep
+from camo_engine import NOISE_CACHE, STAGE_CACHE, RenderParams
+
+
+def test_cache_mb_sets_the_limit_even_below_the_default():
+    old = NOISE_CACHE.max_bytes, STAGE_CACHE.max_bytes
+    frames = sweep(RenderParams.from_preset("M81 Woodland Inspired", width=160, height=120),
+                   "thresh1", 2, 8, 3)
+    limits = [(NOISE_CACHE.max_bytes, STAGE_CACHE.max_bytes)
+              for _ in render_sequence(frames, cache_mb=2)]
+    assert limits == [(1024 * 1024, 1024 * 1024)] * 3
+    assert (NOISE_CACHE.max_bytes, STAGE_CACHE.max_bytes) == old
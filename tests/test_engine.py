@@ -0,0 +1,18 @@
+"""Render contexts keep small scratch buffers only."""
+import camo_engine
+from camo_engine import RenderParams, clear_render_contexts, render_context, render_labels
+
+
+def test_large_scratch_buffers_are_not_kept(monkeypatch):
+    # 320x240: bool masks (75 KB) stay, float64 bands (600 KB) do not.
+    monkeypatch.setattr(camo_engine, "SCRATCH_KEEP_BYTES", 100 * 1024)
+    clear_render_contexts()
+    camo_engine.NOISE_CACHE.clear()
+    camo_engine.STAGE_CACHE.clear()
+    params = RenderParams.from_preset("Tiger Stripe Inspired", width=320, height=240)
+    try:
+        render_labels(params)
+        kept = render_context(320, 240).buffers
+        assert kept and all(buf.nbytes <= 100 * 1024 for buf in kept.values())
+    finally:
+        clear_render_contexts()
@@ -0,0 +1,47 @@
+"""The Numba kernels must give the same labels as the NumPy path."""
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+
+import camo_engine
+from camo_engine import RenderParams, render_labels
+from camo_tiled import iter_bands
+
+
+@pytest.fixture
+def kernels():
+    """Render once with set_kernels(enabled), from cold caches; restores the setting."""
+    previous = camo_engine.USE_KERNELS
+
+    def render(enabled, params, resolution=1.0, band_rows=None):
+        camo_engine.set_kernels(enabled)
+        camo_engine.NOISE_CACHE.clear()
+        camo_engine.STAGE_CACHE.clear()
+        if band_rows:
+            return np.concatenate([band for _, band in iter_bands(params, band_rows=band_rows,
+                                                                  resolution=resolution, labels=True)])
+        return render_labels(params, resolution)
+    yield render
+    camo_engine.set_kernels(previous)
+
+
+@pytest.mark.parametrize("mode", ["Kryptek Inspired", "Tiger Stripe Inspired"])
+@pytest.mark.parametrize("tileable", [False, True])
+@pytest.mark.parametrize("seed", [0, 3])
+def test_kernels_match_numpy(kernels, mode, tileable, seed):
+    params = RenderParams.from_preset(mode, width=613, height=517, seed_offset=seed, tileable=tileable)
+    assert np.array_equal(kernels(True, params), kernels(False, params))
+
+
+@pytest.mark.parametrize("mode", ["Kryptek Inspired", "Tiger Stripe Inspired"])
+@pytest.mark.parametrize("overrides, resolution, band_rows", [
+    ({"precision": "float32"}, 1.0, None),
+    ({}, 0.5, None),
+    ({"distortion": 80.0, "feat_a": 35.0}, 1.0, None),
+    ({}, 1.0, 97),
+])
+def test_kernels_match_numpy_variants(kernels, mode, overrides, resolution, band_rows):
+    params = RenderParams.from_preset(mode, width=613, height=517, **overrides)
+    assert np.array_equal(kernels(True, params, resolution, band_rows),
+                          kernels(False, params, resolution, band_rows))
@@ -0,0 +1,33 @@
+"""Request parsing and cache keys of the render server."""
+import pytest
+
+from camo_server import cache_key, parse_request
+
+
+def test_cache_key_keeps_hidden_layer_colours():
+    # Chocolate Chip paints its chips in the layer3 colour under the layer2
+    # toggle, so hiding layer3 must not drop that colour from the key.
+    query = {"preset": "Chocolate Chip Inspired", "show_layer3": "false"}
+    a = cache_key(parse_request(query))
+    b = cache_key(parse_request(dict(query, layer3="#102030")))
+    assert a != b
+
+
+def test_cache_key_ignores_colour_case():
+    query = {"preset": "Kryptek Inspired", "layer1": "#a0b0c0"}
+    assert cache_key(parse_request(query)) == cache_key(parse_request(dict(query, layer1="#A0B0C0")))
+
+
+@pytest.mark.parametrize("query", [
+    {"layer1": "red"},
+    {"colors": {"base": "#12345"}},
+    {"digital": "1", "block_size": "0"},
+    {"digital": "1", "macro_block_size": "-4"},
+    {"width": "inf"},
+    {"seed": "-inf"},
+    {"scale": "nan"},
+    {"distortion": "inf"},
+])
+def test_parse_request_rejects_bad_values(query):
+    with pytest.raises(ValueError):
+        parse_request(dict(query, preset="Kryptek Inspired"))